@@ -18,7 +18,6 @@ from manim import (
     ORIGIN,
     LaggedStart,
     RoundedRectangle,
-    Wait,
     AnimationGroup,
 )
 
@@ -27,10 +26,9 @@ from data import ARIA_ATTRIBUTES_DATA
 path.append(str(Path(__file__).resolve().parent.parent))
 
 # pylint: disable=wrong-import-position
-from template import MaterialDesign, Template
+from template import FadeToOpacity, MaterialDesign, Template
 
 config.background_color = MaterialDesign.SURFACE
-config.max_files_cached = Template.cached_files_num(__file__)
 
 
 class ARIAAttrScene(Scene):
@@ -39,7 +37,10 @@ class ARIAAttrScene(Scene):
     def construct(self):
         Text.set_default(font=Template.DEFAULT_FONT)
 
-        Template.splash_screen(self)
+        # 正文中的卡片网格由各属性的名称组成
+        Template.splash_screen(
+            self, [attribute["name"] for attribute in ARIA_ATTRIBUTES_DATA]
+        )
 
         # 标题动画
         title = Text(
@@ -53,20 +54,17 @@ class ARIAAttrScene(Scene):
 
         # 动画序列
         Template.add_tts(self, "WAI-ARIA 1.2 属性介绍")
-        self.play(
-            LaggedStart(Write(title), Wait(1), lag_ratio=1),
-            subcaption="WAI-ARIA 1.2 属性介绍",
+        Template.play_and_hold(
+            self, Write(title), hold=1, subcaption="WAI-ARIA 1.2 属性介绍"
         )
         Template.add_tts(self, "全部 48 个无障碍属性简介")
-        self.play(
-            LaggedStart(
-                AnimationGroup(
-                    title.animate.to_edge(UP, buff=0).set_font_size(48),
-                    FadeIn(subtitle, shift=UP),
-                ),
-                Wait(1),
-                lag_ratio=1,
+        Template.play_and_hold(
+            self,
+            AnimationGroup(
+                title.animate.to_edge(UP, buff=0).set_font_size(48),
+                FadeIn(subtitle, shift=UP),
             ),
+            hold=1,
             subcaption="全部 48 个无障碍属性简介",
         )
 
@@ -76,42 +74,17 @@ class ARIAAttrScene(Scene):
 
         # 展示所有属性
         self.play(FadeOut(subtitle))
-        self.play(
-            LaggedStart(
-                *[FadeIn(card, scale=0.8) for card in cards],
-                lag_ratio=0.1,
-            ),
-        )
-        self.wait(1)
+        self.show_attribute_cards(cards)
 
         # 逐个详细介绍属性
-        for i, card in enumerate(cards):
-            # 保存原始位置
-            origin_center = card.get_center()
-
-            # 高亮当前卡片
-            duration = Template.add_tts(
-                self, f"第 {i + 1} 个 {ARIA_ATTRIBUTES_DATA[i]["name"]}"
-            )
-            self.play(
-                card.animate.scale(1.5).next_to(
-                    title, DOWN + LEFT, buff=1, aligned_edge=LEFT
-                ),
-                *[c.animate.set_opacity(0) for c in cards if c != card],
-                subcaption=f"第 {i + 1} 个 {ARIA_ATTRIBUTES_DATA[i]["name"]}",
-            )
-            self.wait(max(ceil(duration) - 1, 0))
-
-            # 解释属性
-            self.explain_attribute(i, card)
-
-            # 恢复原始状态
-            self.play(
-                card.animate.scale(1 / 1.5).move_to(origin_center),
-                *[c.animate.set_opacity(1) for c in cards if c != card],
+        for i in range(len(cards)):
+            Template.next_section(
+                self, ARIA_ATTRIBUTES_DATA[i]["name"], ARIA_ATTRIBUTES_DATA[i]
             )
+            self.introduce_attribute(i, cards, title)
 
         # 结束动画
+        Template.next_section(self, "总结")
         self.play(FadeOut(grid))
         final_group = VGroup(
             Text(
@@ -135,14 +108,12 @@ class ARIAAttrScene(Scene):
         Template.add_tts(
             self, "让我们一起提升 Web 无障碍体验，为所有用户创造包容性的数字环境"
         )
-        self.play(
-            LaggedStart(
-                FadeIn(final_group, shift=UP),
-                Wait(6),
-                lag_ratio=1,
-            ),
+        Template.play_and_hold(
+            self,
+            FadeIn(final_group, shift=UP),
+            hold=6,
             subcaption="让我们一起提升 Web 无障碍体验，为所有用户创造包容性的数字环境",
-            subcaption_offset=0.5,  # type: ignore
+            subcaption_offset=0.5,
         )
         self.play(FadeOut(final_group))
 
@@ -184,6 +155,45 @@ class ARIAAttrScene(Scene):
         grid.next_to(title, DOWN, buff=0.2)
         return grid
 
+    def show_attribute_cards(self, cards: list[VGroup]):
+        """展示所有属性卡片"""
+        self.play(
+            LaggedStart(
+                *[FadeIn(card, scale=0.8) for card in cards],
+                lag_ratio=0.1,
+            ),
+        )
+        self.wait(1)
+
+    def introduce_attribute(self, index: int, cards: list[VGroup], title: Text):
+        """高亮属性卡片，介绍属性后恢复原状"""
+        card = cards[index]
+
+        # 保存原始位置
+        origin_center = card.get_center()
+
+        # 高亮当前卡片
+        duration = Template.add_tts(
+            self, f"第 {index + 1} 个 {ARIA_ATTRIBUTES_DATA[index]["name"]}"
+        )
+        self.play(
+            card.animate.scale(1.5).next_to(
+                title, DOWN + LEFT, buff=1, aligned_edge=LEFT
+            ),
+            FadeToOpacity(*[c for c in cards if c != card], opacity=0),
+            subcaption=f"第 {index + 1} 个 {ARIA_ATTRIBUTES_DATA[index]["name"]}",
+        )
+        self.wait(max(ceil(duration) - 1, 0))
+
+        # 解释属性
+        self.explain_attribute(index, card)
+
+        # 恢复原始状态
+        self.play(
+            card.animate.scale(1 / 1.5).move_to(origin_center),
+            FadeToOpacity(*[c for c in cards if c != card], opacity=1),
+        )
+
     def explain_attribute(self, index: int, attribute_card: VGroup):
         """逐个详细介绍属性"""
         # 创建描述内容
@@ -209,13 +219,11 @@ class ARIAAttrScene(Scene):
 
         # 动画展示
         duration = Template.add_tts(self, self.get_description_subcaption(index))
-        self.play(
-            LaggedStart(
-                Write(description),
-                FadeIn(value_type, scale=0.8),
-                Wait(max(ceil(duration) - 2, 1)),
-                lag_ratio=1,
-            ),
+        Template.play_and_hold(
+            self,
+            Write(description),
+            FadeIn(value_type, scale=0.8),
+            hold=max(ceil(duration) - 2, 1),
             subcaption=self.get_description_subcaption(index),
         )
 
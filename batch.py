@@ -0,0 +1,211 @@
+"""多个项目的批量渲染：按估计的渲染工作量调度（见 main.py prod --all）"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Callable
+
+from events import load
+
+# 渲染工作量以“一帧 1080p 画面”为单位，下面是每次动画与每个分段的固定开销
+# （计算哈希、打开与关闭片段文件、写出分段视频等），按经验粗略折算成帧数。
+# 调度只依赖各项目工作量的相对大小
+REFERENCE_PIXELS = 1920 * 1080
+PLAY_COST = 30.0
+SECTION_COST = 60.0
+
+LOGS_DIR = Path(__file__).resolve().parent / "media" / "logs"
+
+
+@dataclass
+class ProjectCost:
+    """项目的渲染工作量"""
+
+    project: str
+    sections: int
+    plays: int
+    duration: float
+    pixels: int
+    frame_rate: float
+
+    @staticmethod
+    def from_plan(project: str, scenes: list[dict]) -> "ProjectCost":
+        """
+        由项目各场景的时间线（见 main.py plan）汇总项目的工作量
+
+        Args:
+            project: 项目名称
+            scenes: 各场景的时间线
+        """
+        return ProjectCost(
+            project,
+            sections=sum(len(scene["sections"]) for scene in scenes),
+            plays=sum(len(scene["plays"]) for scene in scenes),
+            duration=sum(scene["duration"] for scene in scenes),
+            pixels=max(
+                (scene["pixel_width"] * scene["pixel_height"] for scene in scenes),
+                default=REFERENCE_PIXELS,
+            ),
+            frame_rate=max((scene["frame_rate"] for scene in scenes), default=60.0),
+        )
+
+    @property
+    def cost(self) -> float:
+        """估计的渲染工作量"""
+        frames = self.duration * self.frame_rate
+        return (
+            frames * self.pixels / REFERENCE_PIXELS
+            + self.plays * PLAY_COST
+            + self.sections * SECTION_COST
+        )
+
+
+def schedule(costs: list[ProjectCost], workers: int) -> list[list[ProjectCost]]:
+    """
+    最长处理时间优先（LPT）调度：按工作量从大到小，依次交给当前负载最小的进程
+
+    Args:
+        costs: 各项目的工作量
+        workers: 同时渲染的项目数
+
+    Returns:
+        list[list[ProjectCost]]: 每个进程依次渲染的项目
+    """
+    plan: list[list[ProjectCost]] = [[] for _ in range(workers)]
+    loads = [0.0] * workers
+    for cost in sorted(costs, key=lambda cost: cost.cost, reverse=True):
+        worker = loads.index(min(loads))
+        plan[worker].append(cost)
+        loads[worker] += cost.cost
+    return plan
+
+
+class BatchProgress:
+    """从共用的事件文件中统计各项目已完成的分段，汇总批量渲染的进度"""
+
+    def __init__(self, costs: list[ProjectCost], events_path: Path):
+        self.costs = {cost.project: cost for cost in costs}
+        self.events_path = events_path
+        self.running: set[str] = set()
+        self.finished: set[str] = set()
+        self.lock = Lock()
+        self._last = ""
+
+    def report(self) -> str:
+        """当前进度"""
+        done: dict[str, int] = {}
+        if self.events_path.exists():
+            for event in load(self.events_path):
+                if event["event"] == "section" and event.get("project") in self.costs:
+                    done[event["project"]] = done.get(event["project"], 0) + 1
+
+        completed_cost = 0.0
+        completed_sections = 0
+        for project, cost in self.costs.items():
+            # 失败重试时同一分段会再次计入，因此不超过分段总数
+            sections = (
+                cost.sections
+                if project in self.finished
+                else min(done.get(project, 0), cost.sections)
+            )
+            completed_sections += sections
+            if cost.sections:
+                completed_cost += cost.cost * sections / cost.sections
+        total_cost = sum(cost.cost for cost in self.costs.values()) or 1.0
+        total_sections = sum(cost.sections for cost in self.costs.values())
+        return (
+            f"进度 {completed_cost / total_cost:.0%}："
+            f"项目 {len(self.finished)}/{len(self.costs)}，"
+            f"分段 {completed_sections}/{total_sections}"
+            + (f"；正在渲染 {"、".join(sorted(self.running))}" if self.running else "")
+        )
+
+    def print(self, message: str = ""):
+        """打印进度，未变化时不重复打印"""
+        with self.lock:
+            line = self.report()
+            if message:
+                print(message)
+            if message or line != self._last:
+                print(line)
+                self._last = line
+
+
+def render_batch(
+    costs: list[ProjectCost],
+    workers: int,
+    events_path: Path,
+    render: Callable[[str, Path], None],
+    interval: float = 30,
+) -> dict[str, Path]:
+    """
+    在进程池中按 LPT 顺序渲染各个项目，并定时打印汇总的进度
+
+    项目按工作量从大到小提交，空闲的进程总是领取剩余项目中工作量最大的一个。
+    各项目渲染进程的输出写入 media/logs/<项目>.log，避免相互穿插。
+
+    Args:
+        costs: 各项目的工作量
+        workers: 同时渲染的项目数
+        events_path: 各项目共用的事件文件
+        render: 渲染一个项目的函数，参数为项目名称与日志文件路径
+        interval: 打印进度的间隔（秒）
+
+    Returns:
+        dict[str, Path]: 渲染失败的项目及其日志文件
+    """
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    ordered = sorted(costs, key=lambda cost: cost.cost, reverse=True)
+    plan = schedule(costs, workers)
+    print(f"使用 {workers} 个进程渲染 {len(costs)} 个项目，按估计工作量从大到小调度：")
+    for cost in ordered:
+        print(
+            f"  {cost.project:<24}{cost.cost:>12,.0f}  "
+            f"（{cost.sections} 个分段，{cost.plays} 次动画，{cost.duration:.0f} 秒）"
+        )
+    total = sum(cost.cost for cost in costs) or 1.0
+    makespan = max(sum(cost.cost for cost in projects) for projects in plan)
+    print(f"估计并行用时为串行的 {makespan / total:.0%}")
+
+    progress = BatchProgress(costs, events_path)
+    failed: dict[str, Path] = {}
+    stopped = Event()
+
+    def monitor():
+        while not stopped.wait(interval):
+            progress.print()
+
+    def render_project(project: str) -> float:
+        with progress.lock:
+            progress.running.add(project)
+        start = perf_counter()
+        try:
+            render(project, LOGS_DIR / f"{project}.log")
+        finally:
+            with progress.lock:
+                progress.running.discard(project)
+                progress.finished.add(project)
+        return perf_counter() - start
+
+    monitor_thread = Thread(target=monitor, daemon=True)
+    monitor_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(render_project, cost.project): cost.project
+                for cost in ordered
+            }
+            for future in as_completed(futures):
+                project = futures[future]
+                try:
+                    message = f"{project} 渲染完成，用时 {future.result():.1f} 秒"
+                except Exception:  # pylint: disable=broad-exception-caught
+                    failed[project] = LOGS_DIR / f"{project}.log"
+                    message = f"{project} 渲染失败，日志：{failed[project]}"
+                progress.print(message)
+    finally:
+        stopped.set()
+        monitor_thread.join()
+    return failed
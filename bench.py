@@ -0,0 +1,222 @@
+"""性能基准测试"""
+
+from json import loads
+from os import environ, waitstatus_to_exitcode
+from platform import python_version
+from re import match
+from subprocess import DEVNULL, Popen, run
+from sys import executable
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+try:
+    from os import wait4
+except ImportError:  # Windows
+    wait4 = None  # pylint: disable=invalid-name
+
+ROOT_DIR = Path(__file__).resolve().parent
+
+# 只有真正需要时才应导入的模块
+LAZY_MODULES = ("edge_tts", "aiohttp", "mutagen")
+
+
+def measure_startup(module: str = "template") -> tuple[float, dict[str, float]]:
+    """
+    在新的解释器中冷导入模块，测量导入耗时
+
+    Args:
+        module: 模块名
+
+    Returns:
+        tuple[float, dict[str, float]]: 总耗时（秒）与各顶层包的累计耗时（秒）
+
+    Raises:
+        ValueError: 如果无法导入模块时
+    """
+    result = run(
+        [executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise ValueError(f"无法导入 {module}：{result.stderr.strip().splitlines()[-1]}")
+    packages: dict[str, float] = {}
+    total = 0.0
+    # 每行形如 "import time: self [us] | cumulative | imported package"，
+    # 缩进表示导入层级；子模块先于导入它的模块输出，
+    # 因此上一个顶层导入之后的各行都属于本次导入的模块，之前的是解释器启动时的导入
+    for line in result.stderr.splitlines():
+        if not (m := match(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)", line)):
+            continue
+        self_us, cumulative_us, indent, name = m.groups()
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1e6
+        if not indent:
+            if name == module:
+                total = int(cumulative_us) / 1e6
+                break
+            packages = {}
+    return total, packages
+
+
+def check_startup(budget: float, module: str = "template", top: int = 10) -> bool:
+    """
+    打印模块的冷导入耗时报告，并检查是否超出预算
+
+    Args:
+        budget: 导入耗时预算（秒）
+        module: 模块名
+        top: 列出耗时最多的包的数量
+
+    Returns:
+        bool: 是否在预算之内，且没有导入应当延迟导入的模块
+    """
+    total, packages = measure_startup(module)
+    print(f"冷导入 {module}：{total:.3f} 秒（预算 {budget:.3f} 秒）")
+    for package, seconds in sorted(
+        packages.items(), key=lambda item: item[1], reverse=True
+    )[:top]:
+        print(f"  {package:<24}{seconds:.3f} 秒")
+
+    passed = total <= budget
+    if not passed:
+        print(f"超出预算 {total - budget:.3f} 秒")
+    if eager := [name for name in LAZY_MODULES if name in packages]:
+        print(f"导入时加载了应当延迟导入的模块：{', '.join(eager)}")
+        passed = False
+    return passed
+
+
+# 渲染负载：名称 -> bench_scenes.py 中的场景
+WORKLOADS = {
+    "splash": "SplashBench",
+    "end": "EndBench",
+    "attribute": "AttributeBench",
+    "cards": "CardGridBench",
+}
+QUALITY = "-ql"
+RESULTS_DIR = ROOT_DIR / "media" / "bench"
+RESULTS_PATH = RESULTS_DIR / "results.json"
+BASELINE_PATH = RESULTS_DIR / "baseline.json"
+
+
+def render_workload(name: str) -> dict[str, float | None]:
+    """
+    在新的进程中渲染一个负载
+
+    使用离线 TTS 占位音频并禁用 manim 的分段缓存，使每次测量的工作量相同。
+
+    Args:
+        name: 负载名称
+
+    Returns:
+        dict[str, float | None]: 耗时、帧率、内存峰值与缓存命中率等统计数据
+    """
+    with TemporaryDirectory() as temp_dir:
+        stats_path = Path(temp_dir) / "stats.json"
+        start = perf_counter()
+        process = Popen(  # pylint: disable=consider-using-with
+            [
+                "manim",
+                "render",
+                QUALITY,
+                "--disable_caching",
+                "--media_dir",
+                str(RESULTS_DIR / "media"),
+                "bench_scenes.py",
+                WORKLOADS[name],
+            ],
+            cwd=ROOT_DIR,
+            env={
+                **environ,
+                "TEMPLATE_TTS": "offline",
+                "TEMPLATE_BENCH": str(stats_path),
+            },
+            stdout=DEVNULL,
+        )
+        if wait4 is None:
+            peak_rss = None
+            returncode = process.wait()
+        else:
+            _, status, usage = wait4(process.pid, 0)
+            process.returncode = returncode = waitstatus_to_exitcode(status)
+            peak_rss = usage.ru_maxrss / 1024  # Linux 上单位为 KiB
+        wall_time = perf_counter() - start
+        if returncode != 0:
+            raise ValueError(f"负载 {name} 渲染失败")
+        stats = loads(stats_path.read_text(encoding="utf-8"))
+    return {"wall_time": wall_time, "peak_rss_mib": peak_rss, **stats}
+
+
+def run_suite(names: list[str], repeat: int = 1) -> dict:
+    """
+    渲染各个负载，每个负载取墙钟时间最短的一次
+
+    Args:
+        names: 负载名称
+        repeat: 每个负载渲染的次数
+
+    Returns:
+        dict: 测试结果
+    """
+    results = {}
+    for name in names:
+        print(f"渲染负载 {name}……")
+        results[name] = min(
+            (render_workload(name) for _ in range(repeat)),
+            key=lambda stats: stats["wall_time"],
+        )
+    return {
+        "quality": QUALITY,
+        "python": python_version(),
+        "workloads": results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """
+    打印测试结果及其与基线的对比
+
+    Args:
+        results: 测试结果
+        baseline: 基线
+        threshold: 墙钟时间增加超过该比例时视为性能下降
+
+    Returns:
+        bool: 是否没有性能下降
+    """
+    if baseline.get("quality") != results["quality"]:
+        baseline = {"workloads": {}}
+
+    def delta(current: float | None, previous: float | None) -> str:
+        if current is None or not previous:
+            return ""
+        return f" ({(current - previous) / previous:+.1%})"
+
+    passed = True
+    for name, stats in results["workloads"].items():
+        previous = baseline["workloads"].get(name, {})
+        hit_rate = stats["text_geometry_hit_rate"]
+        print(
+            f"{name:<10}"
+            f"墙钟 {stats["wall_time"]:.2f} 秒"
+            f"{delta(stats["wall_time"], previous.get("wall_time"))}，"
+            f"渲染 {stats["fps"]:.1f} 帧/秒"
+            f"{delta(stats["fps"], previous.get("fps"))}，"
+            + (
+                f"内存峰值 {stats["peak_rss_mib"]:.0f} MiB"
+                f"{delta(stats["peak_rss_mib"], previous.get("peak_rss_mib"))}，"
+                if stats["peak_rss_mib"] is not None
+                else ""
+            )
+            + "文本几何缓存命中率 "
+            + (f"{hit_rate:.0%}" if hit_rate is not None else "-")
+        )
+        previous_time = previous.get("wall_time")
+        if previous_time and stats["wall_time"] > previous_time * (1 + threshold):
+            print(f"  {name} 的墙钟时间超出基线 {threshold:.0%} 以上")
+            passed = False
+    return passed
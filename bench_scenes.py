@@ -0,0 +1,91 @@
+"""基准测试的固定渲染负载（见 main.py bench）"""
+
+from json import dumps
+from os import environ
+from pathlib import Path
+from sys import path
+from time import perf_counter
+
+from manim import UP, Scene, Text, config
+
+path.append(str(Path(__file__).resolve().parent / "ARIAAttr"))
+
+# pylint: disable=wrong-import-position
+from ARIAAttr.main import ARIAAttrScene
+from template import MaterialDesign, Template, TextGeometryCache
+
+
+class BenchScene(Scene):
+    """渲染结束后把统计数据写入环境变量 TEMPLATE_BENCH 指定的文件"""
+
+    def setup(self):
+        Text.set_default(font=Template.DEFAULT_FONT)
+
+    def render(self, preview: bool = False):
+        start = perf_counter()
+        result = super().render(preview)
+        render_time = perf_counter() - start
+
+        frames = round(self.renderer.time * config.frame_rate)
+        lookups = TextGeometryCache.hits + TextGeometryCache.misses
+        Path(environ["TEMPLATE_BENCH"]).write_text(
+            dumps(
+                {
+                    "render_time": render_time,
+                    "frames": frames,
+                    "fps": frames / render_time,
+                    "text_geometry_hits": TextGeometryCache.hits,
+                    "text_geometry_misses": TextGeometryCache.misses,
+                    "text_geometry_hit_rate": (
+                        TextGeometryCache.hits / lookups if lookups else None
+                    ),
+                }
+            ),
+            encoding="utf-8",
+        )
+        return result
+
+
+class SplashBench(BenchScene):
+    """启动屏"""
+
+    def construct(self):
+        Template.splash_screen(self)
+
+
+class EndBench(BenchScene):
+    """结束屏"""
+
+    def construct(self):
+        Template.end_screen(self)
+
+
+class ARIAAttrBench(BenchScene, ARIAAttrScene):
+    """ARIAAttr 中的属性卡片网格"""
+
+    def setup_grid(self):
+        """直接添加标题与属性卡片网格，返回标题与卡片"""
+        title = Text(
+            "WAI-ARIA 1.2 属性介绍", font_size=48, color=MaterialDesign.PRIMARY
+        ).to_edge(UP, buff=0)
+        cards = self.create_attribute_cards()
+        self.arrange_in_grid(cards, title)
+        self.add(title)
+        return title, cards
+
+
+class AttributeBench(ARIAAttrBench):
+    """ARIAAttr 中一个属性的完整分段"""
+
+    def construct(self):
+        title, cards = self.setup_grid()
+        self.add(*cards)
+        self.introduce_attribute(0, cards, title)
+
+
+class CardGridBench(ARIAAttrBench):
+    """ARIAAttr 中全部属性卡片的展示过渡"""
+
+    def construct(self):
+        _, cards = self.setup_grid()
+        self.show_attribute_cards(cards)
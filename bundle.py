@@ -0,0 +1,160 @@
+"""渲染缓存的打包与恢复（见 main.py cache export/import）"""
+
+from hashlib import blake2b
+from io import BytesIO
+from json import dumps, loads
+from os import getpid
+from pathlib import Path
+from shutil import copyfile, copyfileobj
+from tarfile import TarInfo, open as open_tar
+from typing import IO
+
+MEDIA_DIR = Path(__file__).resolve().parent / "media"
+MANIFEST_NAME = "manifest.json"
+BUNDLE_VERSION = 1
+
+# 打包的缓存文件（相对于 media）：TTS 音频、分段存储与 manim 的动画片段
+# （及片段目录所属的项目，见 template.PartialMovieCache）。
+# 这些文件都以内容哈希命名，文件存在即可直接复用
+PATTERNS = (
+    "audios/*.mp3",
+    "segments/*.mp4",
+    "segments/*.json",
+    "videos/*/*/partial_movie_files/*/*.mp4",
+    "videos/*/*/partial_movie_files/*/.project",
+)
+
+
+def digest(path: Path) -> str:
+    """文件内容的哈希"""
+    hasher = blake2b(digest_size=16)
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def collect_files() -> list[Path]:
+    """media 目录中所有要打包的缓存文件"""
+    return sorted(
+        path
+        for pattern in PATTERNS
+        for path in MEDIA_DIR.glob(pattern)
+        if path.is_file()
+    )
+
+
+def export_bundle(bundle_path: Path) -> tuple[int, int]:
+    """
+    把缓存文件打包成一个 tar 文件
+
+    包中首先是清单，记录每个文件的路径、大小与内容哈希；
+    随后每份不同的内容只存一次，以内容哈希命名（blobs/<哈希>）。
+    视频与音频本身已经压缩，因此不再压缩。
+
+    Args:
+        bundle_path: 缓存包的路径
+
+    Returns:
+        tuple[int, int]: 文件数与去重后的内容数
+    """
+    entries = []
+    blobs: dict[str, Path] = {}
+    for path in collect_files():
+        key = digest(path)
+        entries.append(
+            {
+                "path": path.relative_to(MEDIA_DIR).as_posix(),
+                "blob": key,
+                "size": path.stat().st_size,
+            }
+        )
+        blobs.setdefault(key, path)
+    manifest = dumps(
+        {"version": BUNDLE_VERSION, "entries": entries}, ensure_ascii=False
+    ).encode()
+
+    bundle_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = bundle_path.with_name(f"{bundle_path.name}.{getpid()}.part")
+    try:
+        with open_tar(temp_path, "w") as tar:
+            info = TarInfo(MANIFEST_NAME)
+            info.size = len(manifest)
+            tar.addfile(info, BytesIO(manifest))
+            for key, path in blobs.items():
+                tar.add(path, arcname=f"blobs/{key}")
+        temp_path.replace(bundle_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return len(entries), len(blobs)
+
+
+def _write(target: Path, source: IO[bytes] | Path):
+    """先写入临时文件再替换，使渲染进程不会读到写了一半的文件"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = target.with_name(f"{target.name}.{getpid()}.part")
+    try:
+        if isinstance(source, Path):
+            copyfile(source, temp_path)
+        else:
+            with temp_path.open("wb") as f:
+                copyfileobj(source, f)
+        temp_path.replace(target)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def import_bundle(bundle_path: Path) -> tuple[int, int]:
+    """
+    从缓存包中恢复本地缺少的缓存文件
+
+    先读取清单，已存在且大小相同的文件直接跳过；
+    再顺序读取一遍缓存包，只解出缺少的内容，同一份内容写入所有需要它的路径。
+
+    Args:
+        bundle_path: 缓存包的路径
+
+    Returns:
+        tuple[int, int]: 恢复的文件数与跳过的文件数
+
+    Raises:
+        ValueError: 如果缓存包无效或不完整时
+    """
+    with open_tar(bundle_path, "r|*") as tar:
+        member = tar.next()
+        if member is None or member.name != MANIFEST_NAME:
+            raise ValueError(f"{bundle_path} 不是缓存包")
+        manifest = loads(tar.extractfile(member).read())  # type: ignore
+        if manifest.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"不支持的缓存包版本：{manifest.get('version')}")
+
+        missing: dict[str, list[Path]] = {}
+        skipped = 0
+        for entry in manifest["entries"]:
+            target = (MEDIA_DIR / entry["path"]).resolve()
+            if not target.is_relative_to(MEDIA_DIR):
+                raise ValueError(f"缓存包中的路径无效：{entry['path']}")
+            if target.exists() and target.stat().st_size == entry["size"]:
+                skipped += 1
+            else:
+                missing.setdefault(entry["blob"], []).append(target)
+
+        restored = 0
+        for member in tar:
+            if not missing:
+                break
+            targets = missing.pop(member.name.removeprefix("blobs/"), None)
+            if not targets:
+                continue
+            if not member.isfile():
+                raise ValueError("缓存包无效")
+            _write(targets[0], tar.extractfile(member))  # type: ignore
+            for target in targets[1:]:
+                _write(target, targets[0])
+            restored += len(targets)
+
+    if missing:
+        raise ValueError(
+            f"缓存包不完整，缺少 {sum(len(targets) for targets in missing.values())} 个文件"
+        )
+    return restored, skipped
@@ -0,0 +1,179 @@
+"""常驻的预览渲染守护进程及其文件监视客户端"""
+
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from os import environ, getpid
+from pathlib import Path
+from secrets import token_bytes
+from subprocess import Popen, DEVNULL
+from sys import executable, modules, path
+from time import sleep, monotonic
+from traceback import format_exc
+
+ROOT_DIR = Path(__file__).resolve().parent
+ADDRESS = ("127.0.0.1", int(environ.get("TEMPLATE_DAEMON_PORT", "47219")))
+KEY_PATH = ROOT_DIR / "media" / "daemon.key"
+LOG_PATH = ROOT_DIR / "media" / "daemon.log"
+
+
+def _authkey() -> bytes:
+    """读取守护进程的认证密钥"""
+    return KEY_PATH.read_bytes()
+
+
+def serve():
+    """
+    在前台运行守护进程
+
+    启动时加载 manim、模板和 TTS 等模块，之后每次请求只重新载入项目自身的代码，
+    并在本进程中渲染预览视频。
+    """
+    # pylint: disable=import-outside-toplevel,unused-import
+    import manim  # noqa: F401
+    import template  # noqa: F401
+
+    KEY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    KEY_PATH.write_bytes(token_bytes(32))
+    KEY_PATH.chmod(0o600)
+    with Listener(ADDRESS, authkey=_authkey()) as listener:
+        print(f"渲染守护进程已启动（PID {getpid()}），监听 {ADDRESS[0]}:{ADDRESS[1]}")
+        while True:
+            with listener.accept() as connection:
+                request: dict = connection.recv()
+                if request.get("command") == "stop":
+                    connection.send({"ok": True})
+                    break
+                try:
+                    movies = render(request["project"], request.get("tts", "edge"))
+                    connection.send({"ok": True, "movies": movies})
+                except Exception:  # pylint: disable=broad-exception-caught
+                    connection.send({"ok": False, "error": format_exc()})
+    KEY_PATH.unlink(missing_ok=True)
+    print("渲染守护进程已停止")
+
+
+def render(project_name: str, tts: str) -> list[str]:
+    """
+    在守护进程中渲染项目的预览视频
+
+    Args:
+        project_name: 项目名称
+        tts: TTS 后端
+
+    Returns:
+        list[str]: 渲染出的视频路径
+    """
+    # pylint: disable=import-outside-toplevel
+    from manim import tempconfig
+    from manim.utils.module_ops import scene_classes_from_file
+
+    from template import Template
+
+    project_dir = (ROOT_DIR / project_name).resolve()
+    # 丢弃上次载入的项目代码（main.py、data.py 等），使修改生效
+    for name, module in list(modules.items()):
+        module_file = getattr(module, "__file__", None)
+        if module_file and Path(module_file).resolve().is_relative_to(project_dir):
+            del modules[name]
+    Template._source_hash.cache_clear()  # pylint: disable=protected-access
+
+    environ["TEMPLATE_TTS"] = tts
+    movies = []
+    with tempconfig(
+        {
+            "quality": "low_quality",
+            "preview": True,
+            "input_file": project_dir / "main.py",
+        }
+    ):
+        scene_classes = scene_classes_from_file(project_dir / "main.py", full_list=True)
+        # manim 载入项目时会把项目目录插入 sys.path，这里去掉，避免重复插入
+        while str(project_dir) in path:
+            path.remove(str(project_dir))
+        for scene_class in scene_classes:
+            scene = scene_class()
+            scene.render()
+            movies.append(str(scene.renderer.file_writer.movie_file_path))
+    return movies
+
+
+def connect(spawn: bool = True, timeout: float = 30):
+    """
+    连接守护进程
+
+    Args:
+        spawn: 守护进程未运行时是否在后台启动
+        timeout: 等待守护进程启动的最长时间（秒）
+
+    Returns:
+        Connection: 与守护进程的连接
+
+    Raises:
+        ConnectionError: 无法连接到守护进程时
+    """
+    deadline = monotonic() + timeout
+    spawned = False
+    while True:
+        try:
+            return Client(ADDRESS, authkey=_authkey())
+        except (ConnectionRefusedError, FileNotFoundError, AuthenticationError):
+            # 守护进程未运行，或新启动的守护进程尚未写入新的密钥
+            if not spawn:
+                raise ConnectionError("渲染守护进程未运行") from None
+            if not spawned:
+                LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+                with LOG_PATH.open("ab") as log:
+                    Popen(  # pylint: disable=consider-using-with
+                        [executable, str(ROOT_DIR / "main.py"), "daemon"],
+                        cwd=ROOT_DIR,
+                        stdin=DEVNULL,
+                        stdout=log,
+                        stderr=log,
+                        start_new_session=True,
+                    )
+                print(f"已在后台启动渲染守护进程，日志：{LOG_PATH}")
+                spawned = True
+            if monotonic() > deadline:
+                raise ConnectionError("渲染守护进程启动超时") from None
+            sleep(0.2)
+
+
+def stop():
+    """停止守护进程"""
+    with connect(spawn=False) as connection:
+        connection.send({"command": "stop"})
+        connection.recv()
+    print("渲染守护进程已停止")
+
+
+def watch(project_name: str, tts: str = "edge", interval: float = 0.5):
+    """
+    监视项目代码，每次修改后请求守护进程重新渲染预览视频
+
+    Args:
+        project_name: 项目名称
+        tts: TTS 后端
+        interval: 检查文件修改的间隔（秒）
+    """
+    project_dir = ROOT_DIR / project_name
+    last_mtimes = None
+    print(f"监视 {project_name} 中……按 Ctrl+C 退出")
+    try:
+        while True:
+            mtimes = {
+                file: file.stat().st_mtime_ns for file in project_dir.rglob("*.py")
+            }
+            if mtimes != last_mtimes:
+                last_mtimes = mtimes
+                print(f"预览 {project_name}……")
+                start = monotonic()
+                with connect() as connection:
+                    connection.send({"project": project_name, "tts": tts})
+                    reply: dict = connection.recv()
+                if reply["ok"]:
+                    print(f"渲染完成，用时 {monotonic() - start:.1f} 秒")
+                else:
+                    print(reply["error"])
+            sleep(interval)
+    except KeyboardInterrupt:
+        print()
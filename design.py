@@ -0,0 +1,54 @@
+"""视觉样式常量
+
+不依赖 manim，只需要颜色等样式的工具可以直接导入本模块，而无需导入 template。
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass
+class MaterialDesign:
+    """Material 3 设计"""
+
+    PRIMARY = "#E2B7F4"
+    ON_PRIMARY = "#000000"
+    PRIMARY_CONTAINER = "#5B396D"
+    ON_PRIMARY_CONTAINER = "#F6D9FF"
+
+    SECONDARY = "#D3C0D8"
+    ON_SECONDARY = "#000000"
+    SECONDARY_CONTAINER = "#504255"
+    ON_SECONDARY_CONTAINER = "#F0DCF4"
+
+    TERTIARY = "#F5B7B7"
+    ON_TERTIARY = "#000000"
+    TERTIARY_CONTAINER = "#663B3B"
+    ON_TERTIARY_CONTAINER = "#FFDAD9"
+
+    SURFACE = "#161217"
+    ON_SURFACE = "#FFFFFF"
+    SURFACE_VARIANT = "#4B444D"
+    ON_SURFACE_VARIANT = "#FFFFFF"
+
+    OUTLINE = "#F8EDF7"
+    OUTLINE_VARIANT = "#CABFCA"
+
+    ERROR = "#FFECE9"
+    ON_ERROR = "#000000"
+    ERROR_CONTAINER = "#FFAEA4"
+    ON_ERROR_CONTAINER = "#220001"
+
+    SURFACE_DIM = "#161217"
+    SURFACE_BRIGHT = "#544E54"
+    SURFACE_CONTAINER_LOWEST = "#000000"
+    SURFACE_CONTAINER_LOW = "#221E24"
+    SURFACE_CONTAINER = "#342F35"
+    SURFACE_CONTAINER_HIGH = "#3F3A40"
+    SURFACE_CONTAINER_HIGHEST = "#4A454B"
+
+    INVERSE_SURFACE = "#E9E0E7"
+    INVERSE_ON_SURFACE = "#000000"
+    INVERSE_PRIMARY = "#5C3A6E"
+
+    SHADOW = "#000000"
+    SCRIM = "#000000"
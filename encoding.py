@@ -0,0 +1,125 @@
+"""视频的编码配置（见 main.py pre/prod --profile-name）"""
+
+from dataclasses import asdict, dataclass
+from json import dumps
+from pathlib import Path
+from tomllib import TOMLDecodeError, load
+
+ROOT_DIR = Path(__file__).resolve().parent
+CONFIG_NAME = "encoding.toml"
+CODECS = ("libx264", "libx265")
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """
+    编码配置
+
+    Attributes:
+        width: 画面宽度（像素）
+        height: 画面高度（像素）
+        frame_rate: 帧率
+        codec: 编码器（libx264 或 libx265）
+        preset: 编码速度预设（如 ultrafast、medium、slow），None 为编码器的默认值
+        crf: 恒定质量因子，越小质量越高、文件越大
+        threads: 编码线程数，None 为编码器自动选择
+    """
+
+    width: int
+    height: int
+    frame_rate: int
+    codec: str = "libx264"
+    preset: str | None = None
+    crf: int = 23
+    threads: int | None = None
+
+    def __post_init__(self):
+        if self.width <= 0 or self.height <= 0 or self.width % 2 or self.height % 2:
+            raise ValueError("分辨率必须为正偶数")
+        if self.frame_rate <= 0:
+            raise ValueError("帧率必须为正数")
+        if self.codec not in CODECS:
+            raise ValueError(f"编码器必须为 {'、'.join(CODECS)} 之一")
+        if not 0 <= self.crf <= 51:
+            raise ValueError("crf 必须在 0 到 51 之间")
+        if self.threads is not None and self.threads < 1:
+            raise ValueError("编码线程数必须为正整数")
+
+    def manim_args(self) -> list[str]:
+        """manim render 的分辨率与帧率参数"""
+        return ["-r", f"{self.width},{self.height}", "--fps", str(self.frame_rate)]
+
+    def environ(self) -> dict[str, str]:
+        """
+        传给渲染进程的环境变量（见 template.PartialMovieEncoder），
+        与 manim 的默认编码设置相同时为空
+        """
+        encoder = {
+            "codec": self.codec,
+            "preset": self.preset,
+            "crf": self.crf,
+            "threads": self.threads,
+        }
+        if encoder == {"codec": "libx264", "preset": None, "crf": 23, "threads": None}:
+            return {}
+        return {"TEMPLATE_ENCODING": dumps(encoder, sort_keys=True)}
+
+
+# pre 与 prod 默认使用的配置，与 manim 的 -ql 与 -qk 相同
+PROFILES = {
+    "preview": EncodingProfile(854, 480, 15),
+    "production": EncodingProfile(3840, 2160, 60),
+}
+
+
+def load_profiles(project_name: str) -> dict[str, EncodingProfile]:
+    """
+    读取项目可用的编码配置
+
+    内置配置依次被仓库根目录与项目目录中 encoding.toml 的配置覆盖，
+    同名配置中未写出的字段沿用被覆盖的值。
+
+    Args:
+        project_name: 项目名称
+
+    Returns:
+        dict[str, EncodingProfile]: 配置名称与配置
+
+    Raises:
+        ValueError: 如果配置文件无效时
+    """
+    profiles = dict(PROFILES)
+    for path in (ROOT_DIR / CONFIG_NAME, ROOT_DIR / project_name / CONFIG_NAME):
+        if not path.is_file():
+            continue
+        try:
+            with path.open("rb") as f:
+                data = load(f)
+        except TOMLDecodeError as e:
+            raise ValueError(f"{path} 格式错误：{e}") from e
+        for name, values in data.items():
+            if not isinstance(values, dict):
+                raise ValueError(f"{path} 中的 {name} 不是编码配置")
+            base = asdict(profiles[name]) if name in profiles else {}
+            try:
+                profiles[name] = EncodingProfile(**{**base, **values})
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"{path} 中的编码配置 {name} 无效：{e}") from e
+    return profiles
+
+
+def get_profile(project_name: str, name: str) -> EncodingProfile:
+    """
+    获取项目的编码配置
+
+    Args:
+        project_name: 项目名称
+        name: 配置名称
+
+    Raises:
+        ValueError: 如果配置不存在时
+    """
+    profiles = load_profiles(project_name)
+    if name not in profiles:
+        raise ValueError(f"未知的编码配置：{name}（可用：{', '.join(profiles)}）")
+    return profiles[name]
@@ -0,0 +1,143 @@
+"""结构化的计时事件（见 main.py report）"""
+
+from json import dumps, loads
+from os import environ, getpid
+from pathlib import Path
+from time import time
+
+EVENTS_DIR = Path(__file__).resolve().parent / "media" / "events"
+
+
+def emit(event: str, **fields):
+    """
+    向环境变量 TEMPLATE_EVENTS 指定的 JSONL 文件追加一条事件，未设置时什么也不做
+
+    Args:
+        event: 事件类型，如 section、tts
+        fields: 事件的其余字段
+    """
+    if events_path := environ.get("TEMPLATE_EVENTS"):
+        append(Path(events_path), event, **fields)
+
+
+def append(events_path: Path, event: str, **fields):
+    """
+    向 JSONL 文件追加一条事件
+
+    Args:
+        events_path: 事件文件的路径
+        event: 事件类型
+        fields: 事件的其余字段
+    """
+    line = dumps(
+        {"event": event, "time": time(), "pid": getpid(), **fields},
+        ensure_ascii=False,
+    )
+    # 并行渲染时多个进程写入同一文件，每条事件一次写入一整行
+    with events_path.open("a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def load(events_path: Path) -> list[dict]:
+    """读取事件文件"""
+    with events_path.open(encoding="utf-8") as f:
+        return [loads(line) for line in f if line.strip()]
+
+
+def latest() -> Path:
+    """
+    最近一次运行的事件文件
+
+    Raises:
+        ValueError: 如果没有事件文件时
+    """
+    paths = sorted(EVENTS_DIR.glob("*.jsonl"), key=lambda path: path.stat().st_mtime)
+    if not paths:
+        raise ValueError("没有找到事件文件，请先运行 pre 或 prod")
+    return paths[-1]
+
+
+def summarize(events: list[dict], top: int = 10) -> str:
+    """
+    汇总一次运行的事件
+
+    Args:
+        events: 事件
+        top: 列出耗时最多的分段数量
+
+    Returns:
+        str: 汇总报告
+    """
+    runs = [event for event in events if event["event"] == "run"]
+    sections = [event for event in events if event["event"] == "section"]
+    rendered = [section for section in sections if not section["skipped"]]
+    tts = [event for event in events if event["event"] == "tts"]
+
+    lines = []
+    for run in runs:
+        lines.append(
+            f"运行：{run["command"]} {run["project"]}，墙钟 {run["wall_time"]:.1f} 秒"
+            + ("" if run["ok"] else "（失败）")
+        )
+
+    section_time = sum(section["wall_time"] for section in rendered)
+    lines.append(
+        f"分段：渲染 {len(rendered)} 个，共 {section_time:.1f} 秒；"
+        f"跳过 {len(sections) - len(rendered)} 个，"
+        f"共 {sum(s["wall_time"] for s in sections) - section_time:.1f} 秒"
+    )
+    tts_time: dict[str, float] = {}
+    for event in tts:
+        section = event.get("section") or ""
+        tts_time[section] = (
+            tts_time.get(section, 0.0) + event["synthesis_time"] + event["backoff"]
+        )
+    if rendered:
+        lines.append("  耗时最多的分段：")
+        for section in sorted(rendered, key=lambda s: s["wall_time"], reverse=True)[
+            :top
+        ]:
+            lines.append(
+                f"    {section["wall_time"]:7.1f} 秒  {section["name"]}"
+                f"（TTS {tts_time.get(section["name"], 0.0):.1f} 秒）"
+            )
+
+    hits = [event for event in tts if event["cache"] == "hit"]
+    misses = [event for event in tts if event["cache"] == "miss"]
+    failures = [event for event in misses if event.get("error")]
+    if tts:
+        lines.append(
+            f"TTS：共 {len(tts)} 条，缓存命中 {len(hits)} 条（{len(hits) / len(tts):.0%}），"
+            f"合成 {len(misses) - len(failures)} 条，失败 {len(failures)} 条"
+        )
+        lines.append(
+            f"  合成 {sum(event["synthesis_time"] for event in misses):.1f} 秒，"
+            f"重试 {sum(event["retries"] for event in misses)} 次，"
+            f"退避等待 {sum(event["backoff"] for event in misses):.1f} 秒，"
+            f"新增音频 {sum(event["bytes"] for event in misses) / 1024**2:.1f} MiB"
+        )
+
+    if movie_caches := [event for event in events if event["event"] == "movie_cache"]:
+        hits = sum(event["hits"] for event in movie_caches)
+        plays = hits + sum(event["misses"] for event in movie_caches)
+        lines.append(
+            f"动画片段缓存：共 {plays} 个，命中 {hits} 个"
+            f"（{hits / plays if plays else 0:.0%}），"
+            f"淘汰 {sum(event["evicted"] for event in movie_caches)} 个，"
+            f"释放 {sum(event["freed"] for event in movie_caches) / 1024**2:.1f} MiB"
+        )
+
+    if clients := [event for event in events if event["event"] == "tts_client"]:
+        lines.append(
+            f"TTS 客户端：尝试 {sum(event["attempts"] for event in clients)} 次，"
+            f"限流等待 {sum(event["throttled"] for event in clients):.1f} 秒，"
+            f"熔断拒绝 {sum(event["rejected"] for event in clients)} 条"
+        )
+
+    if runs and not any(section.get("job") for section in sections):
+        # 并行渲染时各进程的分段相互重叠，无法这样计算
+        other = sum(run["wall_time"] for run in runs) - sum(
+            section["wall_time"] for section in sections
+        )
+        lines.append(f"分段以外（启动 manim、合并视频等）：{other:.1f} 秒")
+    return "\n".join(lines)
@@ -7,10 +7,17 @@ from subprocess import run, CalledProcessError
 from sys import exit as sys_exit
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Callable
-from os import environ
+from typing import Optional, Callable, TextIO
+from os import cpu_count, environ
 from functools import wraps
+from inspect import signature
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from shutil import rmtree, which
+from tempfile import TemporaryDirectory
+from json import dumps, loads
+from contextlib import contextmanager
+from time import perf_counter
 
 
 def main():
@@ -44,6 +51,28 @@ def main():
         nargs="?",
         help="项目名称",
     )
+    pre_parser.add_argument(
+        "--profile-name",
+        metavar="NAME",
+        help="编码配置（见 encoding.toml），默认为 preview",
+    )
+    pre_parser.add_argument(
+        "--tts",
+        choices=["edge", "offline"],
+        default="edge",
+        help="TTS 后端，offline 使用离线生成的静音占位音频",
+    )
+    pre_parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="监视项目代码，修改后由常驻的渲染守护进程重新渲染预览",
+    )
+    pre_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="采样分析渲染耗时，按分段生成热点报告与火焰图数据",
+    )
 
     # 生产命令
     prod_parser = subparsers.add_parser(
@@ -51,9 +80,61 @@ def main():
         help="渲染高质量视频",
     )
     prod_parser.add_argument(
-        "project",
-        nargs="?",
-        help="项目名称",
+        "projects",
+        nargs="*",
+        metavar="project",
+        help="项目名称，指定多个项目时批量渲染",
+    )
+    prod_parser.add_argument(
+        "--all",
+        action="store_true",
+        help="批量渲染所有项目",
+    )
+    prod_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="批量渲染时同时渲染的项目数，默认为 CPU 核心数",
+    )
+    prod_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="并行渲染的进程数",
+    )
+    prod_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="只重新渲染输入发生变化的分段，其余分段从上次的渲染结果中复用",
+    )
+    prod_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="采样分析渲染耗时，按分段生成热点报告与火焰图数据",
+    )
+    prod_parser.add_argument(
+        "--profile-name",
+        metavar="NAME",
+        help="编码配置（见 encoding.toml），默认为 production",
+    )
+    prod_parser.add_argument(
+        "--renditions",
+        nargs="+",
+        default=[],
+        metavar="rendition",
+        help="渲染后由视频派生的输出版本（1080p、720p、thumbnail、audio、teaser）",
+    )
+
+    # 守护进程命令
+    daemon_parser = subparsers.add_parser(
+        "daemon",
+        help="运行常驻的预览渲染守护进程",
+    )
+    daemon_parser.add_argument(
+        "--stop",
+        action="store_true",
+        help="停止正在运行的守护进程",
     )
 
     # 新建项目命令
@@ -66,6 +147,143 @@ def main():
         help="项目名称",
     )
 
+    # 时间线命令
+    plan_parser = subparsers.add_parser(
+        "plan",
+        help="不渲染视频，输出项目的时间线（分段、动画、旁白与字幕）",
+    )
+    plan_parser.add_argument(
+        "project",
+        nargs="?",
+        help="项目名称",
+    )
+    plan_parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="时间线文件，默认为 media/plans/<项目>.json",
+    )
+    plan_parser.add_argument(
+        "--profile-name",
+        metavar="NAME",
+        help="编码配置（见 encoding.toml），决定记录的分辨率与帧率，默认为 preview",
+    )
+
+    # TTS 命令
+    tts_parser = subparsers.add_parser(
+        "tts",
+        help="管理 TTS 音频",
+    )
+    tts_subparsers = tts_parser.add_subparsers(
+        title="TTS 子命令", dest="tts_command", required=True
+    )
+    prefetch_parser = tts_subparsers.add_parser(
+        "prefetch",
+        help="不渲染视频，并发预先合成项目需要的全部 TTS 音频",
+    )
+    prefetch_parser.add_argument(
+        "project",
+        nargs="?",
+        help="项目名称",
+    )
+    prefetch_parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=8,
+        help="同时进行的合成任务数",
+    )
+
+    # 缓存命令
+    cache_parser = subparsers.add_parser(
+        "cache",
+        help="管理缓存",
+    )
+    cache_subparsers = cache_parser.add_subparsers(
+        title="缓存子命令", dest="cache_command", required=True
+    )
+    gc_parser = cache_subparsers.add_parser(
+        "gc",
+        help="整理 TTS 音频缓存，并按最近最少使用的顺序淘汰音频",
+    )
+    gc_parser.add_argument(
+        "--max-size",
+        type=parse_size,
+        required=True,
+        help="缓存总大小上限，如 500M、2G",
+    )
+    export_parser = cache_subparsers.add_parser(
+        "export",
+        help="把 TTS 音频、分段与动画片段缓存打包成一个去重的缓存包",
+    )
+    export_parser.add_argument(
+        "bundle",
+        type=Path,
+        help="缓存包的路径，如 render-cache.tar",
+    )
+    import_parser = cache_subparsers.add_parser(
+        "import",
+        help="从缓存包中恢复本地缺少的缓存文件",
+    )
+    import_parser.add_argument(
+        "bundle",
+        type=Path,
+        help="缓存包的路径",
+    )
+
+    # 报告命令
+    report_parser = subparsers.add_parser(
+        "report",
+        help="汇总一次预览或渲染的计时事件",
+    )
+    report_parser.add_argument(
+        "events",
+        nargs="?",
+        type=Path,
+        help="事件文件（media/events/*.jsonl），默认为最近一次运行",
+    )
+
+    # 基准测试命令
+    bench_parser = subparsers.add_parser(
+        "bench",
+        help="运行性能基准测试",
+    )
+    bench_parser.add_argument(
+        "workloads",
+        nargs="*",
+        metavar="workload",
+        help="要渲染的负载（splash、end、attribute、cards），默认全部",
+    )
+    bench_parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=1,
+        help="每个负载渲染的次数，取最快的一次",
+    )
+    bench_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="墙钟时间比基线增加超过该比例时失败",
+    )
+    bench_parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="把本次结果保存为基线",
+    )
+    bench_parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="只测量冷导入 template 的耗时，超出预算或提前导入了 TTS 依赖时失败",
+    )
+    bench_parser.add_argument(
+        "--budget",
+        type=float,
+        default=float(environ.get("TEMPLATE_IMPORT_BUDGET", "3")),
+        help="冷导入耗时预算（秒），也可通过环境变量 TEMPLATE_IMPORT_BUDGET 设置",
+    )
+
     args = parser.parse_args()
 
     if not args.command:
@@ -73,32 +291,117 @@ def main():
         sys_exit(1)
 
     try:
+        # 动画片段缓存的大小上限由渲染进程读取（见 template.PartialMovieCache）
+        if max_size := environ.get("MOVIE_CACHE_MAX_SIZE"):
+            environ["TEMPLATE_MOVIE_CACHE_SIZE"] = str(parse_size(max_size))
+
         if args.command == "install":
             handle_install(args.packages)
         elif args.command == "pre":
-            handle_preview(args.project)
+            handle_preview(
+                args.project,
+                tts=args.tts,
+                watch=args.watch,
+                profile=args.profile,
+                profile_name=args.profile_name,
+            )
+        elif args.command == "prod" and (args.all or len(args.projects) > 1):
+            if args.jobs > 1 or args.profile:
+                raise ValueError("批量渲染时不能使用 --jobs 或 --profile")
+            handle_batch_production(
+                args.projects,
+                args.workers,
+                args.incremental,
+                args.renditions,
+                args.profile_name,
+            )
         elif args.command == "prod":
-            handle_production(args.project)
+            handle_production(
+                args.projects[0] if args.projects else None,
+                jobs=args.jobs,
+                incremental=args.incremental,
+                profile=args.profile,
+                renditions=args.renditions,
+                profile_name=args.profile_name,
+            )
+        elif args.command == "daemon":
+            handle_daemon(args.stop)
         elif args.command == "new":
             handle_new_project(args.project)
+        elif args.command == "plan":
+            handle_plan(args.project, args.output, args.profile_name)
+        elif args.command == "tts" and args.tts_command == "prefetch":
+            handle_tts_prefetch(args.project, args.concurrency)
+        elif args.command == "cache" and args.cache_command == "gc":
+            handle_cache_gc(args.max_size)
+        elif args.command == "cache" and args.cache_command == "export":
+            handle_cache_export(args.bundle)
+        elif args.command == "cache" and args.cache_command == "import":
+            handle_cache_import(args.bundle)
+        elif args.command == "report":
+            handle_report(args.events)
+        elif args.command == "bench":
+            if args.startup:
+                handle_bench_startup(args.budget)
+            else:
+                handle_bench(
+                    args.workloads, args.repeat, args.threshold, args.save_baseline
+                )
     except ValueError as e:
         print(f"错误：{e}")
         sys_exit(1)
 
 
+def parse_size(size: str) -> int:
+    """
+    解析带单位的大小
+
+    Args:
+        size: 大小，如 “1024”、“500K”、“500M”、“2G”
+
+    Returns:
+        int: 字节数
+
+    Raises:
+        ValueError: 如果无法解析或为负数时
+    """
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3}
+    size = size.strip().upper().removesuffix("B")
+    try:
+        if size and size[-1] in units:
+            value = int(float(size[:-1]) * units[size[-1]])
+        else:
+            value = int(size)
+    except ValueError as e:
+        raise ValueError(f"无效的大小：{size}") from e
+    if value < 0:
+        raise ValueError(f"大小不能为负数：{size}")
+    return value
+
+
 def github_actions_retry(func: Callable) -> Callable:
-    """装饰器：在 GitHub Actions 环境中自动重试失败的操作（最多 3 次）"""
+    """
+    装饰器：在 GitHub Actions 环境中自动重试失败的操作（最多 3 次）
+
+    被装饰的函数有 resume 参数时，重试时传入 resume=True，
+    使其从上次完成的分段继续（见 render_production）。
+    """
+    resumable = "resume" in signature(func).parameters
 
     @wraps(func)
-    def wrapper(project_name: Optional[str] = None):
+    def wrapper(*args, **kwargs):
         max_attempts = 3 if environ.get("GITHUB_ACTIONS") == "true" else 1
 
         for attempt in range(1, max_attempts + 1):
             try:
-                return func(project_name)
+                return func(*args, **kwargs)
             except CalledProcessError:
                 if attempt < max_attempts:
-                    print("失败，重试中……")
+                    if resumable:
+                        print("失败，从上次完成的分段继续重试……")
+                        kwargs["resume"] = True
+                    else:
+                        print("失败，重试中……")
                     sleep(1)
                 else:
                     raise
@@ -176,6 +479,25 @@ def validate_project(project_name: str):
         raise ValueError(f'项目 "{project_name}" 中没有 main.py 文件')
 
 
+def validate_renditions(names: list[str]):
+    """
+    确认输出版本的名称有效，且系统中安装了 ffmpeg
+
+    Args:
+        names: 输出版本的名称
+
+    Raises:
+        ValueError: 如果有未知的输出版本，或没有安装 ffmpeg 时
+    """
+    # pylint: disable=import-outside-toplevel
+    from renditions import RENDITIONS
+
+    if unknown := [name for name in names if name not in RENDITIONS]:
+        raise ValueError(f"未知的输出版本：{', '.join(unknown)}")
+    if names and which("ffmpeg") is None:
+        raise ValueError("派生输出版本需要 ffmpeg")
+
+
 def handle_install(packages: list[str]):
     """
     执行更新并安装 pip 依赖包命令。
@@ -207,34 +529,700 @@ def handle_install(packages: list[str]):
     run(["pip", "install", "-r", str(req_txt)], check=True)
 
 
-@github_actions_retry
-def handle_preview(project_name: Optional[str] = None):
+def handle_preview(
+    project_name: Optional[str] = None,
+    tts: str = "edge",
+    watch: bool = False,
+    profile: bool = False,
+    profile_name: Optional[str] = None,
+):
     """
     预览视频
 
     Args:
         project_name: 项目名称
+        tts: TTS 后端
+        watch: 是否监视项目代码并在修改后重新渲染
+        profile: 是否采样分析渲染耗时
+        profile_name: 编码配置，默认为 preview
     """
     if project_name is None:
         project_name = select_project()
     validate_project(project_name)
+    if watch and profile:
+        raise ValueError("--profile 不能与 --watch 同时使用")
+    if watch and profile_name:
+        # 守护进程常驻内存，始终使用默认的预览配置
+        raise ValueError("--profile-name 不能与 --watch 同时使用")
+    # pylint: disable=import-outside-toplevel
+    from encoding import get_profile
+
+    encoding = get_profile(project_name, profile_name or "preview")
+    if watch:
+        # pylint: disable=import-outside-toplevel
+        from daemon import watch as watch_project
+
+        watch_project(project_name, tts)
+        return
     print(f"预览 {project_name}……")
-    run(["manim", "render", "-pql", f"{project_name}/main.py"], check=True)
+    env = {**environ, "TEMPLATE_TTS": tts, **encoding.environ()}
+    if profile:
+        env["TEMPLATE_PROFILE"] = str(profile_dir(project_name))
+    render_preview(project_name, env, encoding.manim_args())
+    if profile:
+        print_profile(Path(env["TEMPLATE_PROFILE"]))
+    auto_collect_garbage()
 
 
 @github_actions_retry
-def handle_production(project_name: Optional[str] = None):
+def render_preview(project_name: str, env: dict[str, str], quality: list[str]):
+    """
+    渲染并打开预览视频
+
+    Args:
+        project_name: 项目名称
+        env: 渲染进程的环境变量
+        quality: manim 的分辨率与帧率参数
+    """
+    with record_run("pre", project_name, env):
+        run(
+            [
+                "manim",
+                "render",
+                "-p",
+                *quality,
+                f"{project_name}/main.py",
+            ],
+            check=True,
+            env=env,
+        )
+
+
+@contextmanager
+def record_run(command: str, project_name: str, env: dict[str, str]):
+    """
+    记录一次运行的墙钟时间，渲染进程的计时事件写入同一文件（见 main.py report）
+
+    Args:
+        command: 子命令
+        project_name: 项目名称
+        env: 渲染进程的环境变量，未设置 TEMPLATE_EVENTS 时在其中设置
+    """
+    # pylint: disable=import-outside-toplevel
+    from events import EVENTS_DIR, append
+
+    if "TEMPLATE_EVENTS" not in env:
+        EVENTS_DIR.mkdir(parents=True, exist_ok=True)
+        env["TEMPLATE_EVENTS"] = str(
+            EVENTS_DIR / f"{project_name}-{datetime.now():%Y%m%d-%H%M%S}.jsonl"
+        )
+    start = perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        append(
+            Path(env["TEMPLATE_EVENTS"]),
+            "run",
+            command=command,
+            project=project_name,
+            ok=ok,
+            wall_time=perf_counter() - start,
+        )
+
+
+def handle_report(events_path: Optional[Path] = None):
+    """
+    汇总一次运行的计时事件
+
+    Args:
+        events_path: 事件文件，默认为最近一次运行
+    """
+    # pylint: disable=import-outside-toplevel
+    import events
+
+    events_path = events_path or events.latest()
+    if not events_path.exists():
+        raise ValueError(f"事件文件不存在：{events_path}")
+    print(f"{events_path}：")
+    print(events.summarize(events.load(events_path)))
+
+
+def profile_dir(project_name: str) -> Path:
+    """本次渲染的分析结果目录"""
+    return (
+        Path("media")
+        / "profiles"
+        / project_name
+        / datetime.now().strftime("%Y%m%d-%H%M%S")
+    ).resolve()
+
+
+def print_profile(output_dir: Path):
+    """
+    打印分析报告的位置
+
+    Args:
+        output_dir: 分析结果目录
+    """
+    print(f"分段热点报告：{output_dir / "report.txt"}")
+    print(
+        "折叠调用栈（可用 flamegraph.pl 或 speedscope 打开）："
+        f"{output_dir / "stacks.collapsed"}"
+    )
+
+
+def handle_daemon(stop: bool = False):
+    """
+    运行或停止预览渲染守护进程
+
+    Args:
+        stop: 是否停止正在运行的守护进程
+    """
+    # pylint: disable=import-outside-toplevel
+    import daemon
+
+    try:
+        if stop:
+            daemon.stop()
+        else:
+            daemon.serve()
+    except ConnectionError as e:
+        raise ValueError(str(e)) from e
+
+
+def handle_production(
+    project_name: Optional[str] = None,
+    jobs: int = 1,
+    incremental: bool = False,
+    profile: bool = False,
+    renditions: Optional[list[str]] = None,
+    profile_name: Optional[str] = None,
+):
     """
     渲染高质量视频
 
     Args:
         project_name: 项目名称
+        jobs: 并行渲染的进程数
+        incremental: 是否只重新渲染输入发生变化的分段
+        profile: 是否采样分析渲染耗时
+        renditions: 渲染后由视频派生的输出版本
+        profile_name: 编码配置，默认为 production
     """
     if project_name is None:
         project_name = select_project()
     validate_project(project_name)
+    if jobs < 1:
+        raise ValueError("并行渲染的进程数必须为正整数")
+    if jobs > 1 and profile:
+        # 并行渲染时各分段的耗时分散在多个进程中，无法归入同一份报告
+        raise ValueError("--profile 不能与 --jobs 同时使用")
+    validate_renditions(renditions or [])
+    # pylint: disable=import-outside-toplevel
+    from encoding import get_profile
+
+    encoding = get_profile(project_name, profile_name or "production")
     print(f"渲染 {project_name}……")
-    run(["manim", "render", "-qk", f"{project_name}/main.py"], check=True)
+    overrides = encoding.environ()
+    if profile:
+        overrides["TEMPLATE_PROFILE"] = str(profile_dir(project_name))
+    events_path = render_production(
+        project_name, jobs, incremental, overrides, quality=encoding.manim_args()
+    )
+    # 派生输出版本不在重试范围内，失败时不必重新渲染
+    if renditions:
+        derive_renditions(project_name, events_path, renditions)
+    if profile:
+        print_profile(Path(overrides["TEMPLATE_PROFILE"]))
+    auto_collect_garbage()
+
+
+@github_actions_retry
+def render_production(
+    project_name: str,
+    jobs: int = 1,
+    incremental: bool = False,
+    overrides: Optional[dict[str, str]] = None,
+    output: Optional[TextIO] = None,
+    quality: Optional[list[str]] = None,
+    resume: bool = False,
+) -> Path:
+    """
+    渲染一个项目的高质量视频
+
+    Args:
+        project_name: 项目名称
+        jobs: 并行渲染的进程数
+        incremental: 是否只重新渲染输入发生变化的分段
+        overrides: 渲染进程另外的环境变量
+        output: 渲染进程的输出，默认为终端
+        quality: manim 的分辨率与帧率参数，默认为 -qk
+        resume: 是否复用上次失败前保存了检查点的分段（重试时由 github_actions_retry 传入）
+
+    Returns:
+        Path: 渲染的事件文件
+    """
+    quality = quality or ["-qk"]
+    env = {**environ, **(overrides or {})}
+    if incremental:
+        env["TEMPLATE_INCREMENTAL"] = "1"
+    with record_run("prod", project_name, env):
+        if jobs > 1:
+            # 先统一预取 TTS 音频，避免各个渲染进程重复合成同一句话
+            handle_tts_prefetch(project_name)
+            render_sections_in_parallel(project_name, quality, jobs, env)
+
+        command = ["manim", "render", *quality, f"{project_name}/main.py"]
+        # 记录分段后才能复用所有项目共用的启动屏与结束屏，拼接视频需要 ffmpeg
+        if incremental or which("ffmpeg") is not None:
+            # pylint: disable=import-outside-toplevel
+            from segments import splice
+
+            segments_env = {**env}
+            if environ.get("GITHUB_ACTIONS") == "true":
+                # 失败后会重试，每完成一个分段就保存检查点
+                segments_env["TEMPLATE_CHECKPOINT"] = "1"
+            if resume:
+                segments_env["TEMPLATE_RESUME"] = "1"
+            with TemporaryDirectory() as temp_dir:
+                record_path = Path(temp_dir) / "segments.json"
+                segments_env["TEMPLATE_SEGMENTS"] = str(record_path)
+                run(
+                    [*command, "--save_sections"],
+                    check=True,
+                    env=segments_env,
+                    stdout=output,
+                    stderr=output,
+                )
+                splice(record_path, store_all=incremental)
+        else:
+            # 无法拼接分段，重试时只能从头渲染
+            run(command, check=True, env=env, stdout=output, stderr=output)
+    return Path(env["TEMPLATE_EVENTS"])
+
+
+def derive_renditions(
+    project_name: str,
+    events_path: Path,
+    renditions: list[str],
+    output: Optional[TextIO] = None,
+):
+    """
+    由项目渲染出的各个视频派生输出版本
+
+    Args:
+        project_name: 项目名称
+        events_path: 渲染的事件文件，其中的 movie 事件记录了输出视频的路径
+        renditions: 输出版本的名称
+        output: 进度信息的输出，默认为终端
+    """
+    # pylint: disable=import-outside-toplevel
+    from events import load
+    from renditions import derive
+
+    movies = {
+        event["path"]
+        for event in load(events_path)
+        if event["event"] == "movie" and event["project"] == project_name
+    }
+    for movie in sorted(movies):
+        print(f"派生 {movie} 的输出版本：{', '.join(renditions)}……", file=output)
+        print(f"输出版本清单：{derive(Path(movie), renditions)}", file=output)
+
+
+def handle_batch_production(
+    project_names: list[str],
+    workers: Optional[int] = None,
+    incremental: bool = False,
+    renditions: Optional[list[str]] = None,
+    profile_name: Optional[str] = None,
+):
+    """
+    批量渲染多个项目的高质量视频
+
+    先由各项目的时间线（见 main.py plan）估计渲染工作量（分段数、动画数、时长与分辨率），
+    并一次性预取所有项目需要的 TTS 音频，再按工作量从大到小调度到多个进程中渲染。
+
+    Args:
+        project_names: 项目名称，为空时渲染所有项目
+        workers: 同时渲染的项目数，默认为 CPU 核心数
+        incremental: 是否只重新渲染输入发生变化的分段
+        renditions: 渲染后由视频派生的输出版本
+        profile_name: 编码配置，默认为 production
+    """
+    project_names = list(dict.fromkeys(project_names)) or get_valid_projects()
+    if not project_names:
+        raise ValueError("没有找到有效项目")
+    for project_name in project_names:
+        validate_project(project_name)
+    if workers is None:
+        workers = min(len(project_names), cpu_count() or 1)
+    if workers < 1:
+        raise ValueError("同时渲染的项目数必须为正整数")
+    validate_renditions(renditions or [])
+
+    # pylint: disable=import-outside-toplevel
+    from batch import ProjectCost, render_batch
+    from encoding import get_profile
+    from events import EVENTS_DIR
+    from tts import TTSRequest, prefetch
+
+    encodings = {
+        project_name: get_profile(project_name, profile_name or "production")
+        for project_name in project_names
+    }
+    print(f"估计 {len(project_names)} 个项目的渲染工作量……")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        plans = list(
+            executor.map(
+                lambda name: plan_project(name, encodings[name].manim_args()),
+                project_names,
+            )
+        )
+
+    # 所有项目共用同一个 TTS 客户端与缓存，相同的句子只合成一次
+    cached, synthesized = prefetch(
+        TTSRequest(**narration["request"])
+        for scenes in plans
+        for scene in scenes
+        for narration in scene["narration"]
+    )
+    print(f"TTS 预取完成：缓存 {cached} 条，新合成 {synthesized} 条")
+
+    EVENTS_DIR.mkdir(parents=True, exist_ok=True)
+    events_path = EVENTS_DIR / f"batch-{datetime.now():%Y%m%d-%H%M%S}.jsonl"
+
+    def render_project(project_name: str, log_path: Path):
+        with log_path.open("w", encoding="utf-8") as log:
+            render_production(
+                project_name,
+                incremental=incremental,
+                overrides={
+                    "TEMPLATE_EVENTS": str(events_path),
+                    **encodings[project_name].environ(),
+                },
+                output=log,
+                quality=encodings[project_name].manim_args(),
+            )
+            if renditions:
+                derive_renditions(project_name, events_path, renditions, log)
+
+    failed = render_batch(
+        [
+            ProjectCost.from_plan(project_name, scenes)
+            for project_name, scenes in zip(project_names, plans)
+        ],
+        workers,
+        events_path,
+        render_project,
+    )
+    print(f"计时事件：{events_path}")
+    auto_collect_garbage()
+    if failed:
+        raise ValueError(
+            "以下项目渲染失败："
+            + "，".join(f"{name}（日志：{log}）" for name, log in failed.items())
+        )
+
+
+def render_sections_in_parallel(
+    project_name: str, quality: list[str], jobs: int, env: dict[str, str]
+):
+    """
+    把场景的各个分段分配给多个 manim 进程并行渲染
+
+    每个进程使用独立的媒体目录，只渲染分配给它的分段（见 Template.next_section）。
+    全部完成后，把各进程生成的片段文件移入默认媒体目录的片段缓存，
+    随后的完整渲染会按哈希命中这些片段，只负责拼接，因此结果与串行渲染逐帧一致。
+
+    Args:
+        project_name: 项目名称
+        quality: manim 的分辨率与帧率参数
+        jobs: 并行渲染的进程数
+        env: 渲染进程的环境变量
+    """
+    media_dir = Path("media")
+    jobs_dir = media_dir / "jobs"
+
+    def render_job(index: int):
+        run(
+            [
+                "manim",
+                "render",
+                *quality,
+                "--media_dir",
+                str(jobs_dir / str(index)),
+                f"{project_name}/main.py",
+            ],
+            check=True,
+            env={**env, "TEMPLATE_JOB": f"{index}/{jobs}"},
+        )
+
+    print(f"使用 {jobs} 个进程并行渲染分段……")
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(render_job, range(jobs)))
+
+    # media/jobs/<序号>/videos/<模块>/<质量>/partial_movie_files/<场景>
+    for partial_dir in jobs_dir.glob("*/videos/*/*/partial_movie_files/*"):
+        target_dir = media_dir / partial_dir.relative_to(partial_dir.parents[4])
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for partial_movie in partial_dir.iterdir():
+            if partial_movie.name != "partial_movie_file_list.txt":
+                partial_movie.replace(target_dir / partial_movie.name)
+    rmtree(jobs_dir)
+
+
+def collect_tts_requests(project_name: str) -> list[dict[str, str]]:
+    """
+    由项目的时间线收集其中全部 TTS 请求
+
+    Args:
+        project_name: 项目名称
+
+    Returns:
+        list[dict[str, str]]: TTS 请求的参数
+    """
+    return [
+        narration["request"]
+        for scene in plan_project(project_name)
+        for narration in scene["narration"]
+    ]
+
+
+def plan_project(project_name: str, quality: Optional[list[str]] = None) -> list[dict]:
+    """
+    以 dry run 方式执行项目场景，记录各场景的时间线（见 template.TimelinePlanner）
+
+    不渲染画面、不编码视频，也不合成 TTS 音频：旁白使用缓存的时长，
+    未缓存时按文本长度与语速估计。
+
+    Args:
+        project_name: 项目名称
+        quality: manim 的分辨率与帧率参数，决定记录的分辨率与帧率，默认为 -ql
+
+    Returns:
+        list[dict]: 各场景的时长、分辨率，以及分段、动画、旁白与字幕
+    """
+    with TemporaryDirectory() as temp_dir:
+        plan_path = Path(temp_dir) / "plan.jsonl"
+        plan_path.touch()
+        run(
+            [
+                "manim",
+                "render",
+                "--dry_run",
+                *(quality or ["-ql"]),
+                f"{project_name}/main.py",
+            ],
+            check=True,
+            env={**environ, "TEMPLATE_PLAN": str(plan_path)},
+        )
+        with plan_path.open(encoding="utf-8") as f:
+            return [loads(line) for line in f if line.strip()]
+
+
+def handle_plan(
+    project_name: Optional[str] = None,
+    output: Optional[Path] = None,
+    profile_name: Optional[str] = None,
+):
+    """
+    不渲染视频，打印项目的时间线概要，并把完整的时间线写入 JSON 文件
+
+    Args:
+        project_name: 项目名称
+        output: 时间线文件，默认为 media/plans/<项目>.json
+        profile_name: 编码配置，决定记录的分辨率与帧率，默认为 preview
+    """
+    if project_name is None:
+        project_name = select_project()
+    validate_project(project_name)
+
+    from encoding import get_profile  # pylint: disable=import-outside-toplevel
+
+    encoding = get_profile(project_name, profile_name or "preview")
+    print(f"规划 {project_name} 的时间线……")
+    scenes = plan_project(project_name, encoding.manim_args())
+
+    def timestamp(seconds: float) -> str:
+        # 先取整到 0.1 秒再分出分钟，避免出现 0:60.0
+        minutes, tenths = divmod(round(seconds * 10), 600)
+        return f"{minutes}:{tenths / 10:04.1f}"
+
+    for scene in scenes:
+        cached = sum(narration["cached"] for narration in scene["narration"])
+        print(
+            f"{scene["scene"]}：时长 {timestamp(scene["duration"])}，"
+            f"{len(scene["sections"])} 个分段，{len(scene["plays"])} 次动画，"
+            f"{len(scene["narration"])} 条旁白"
+            f"（{cached} 条已缓存，{len(scene["narration"]) - cached} 条为估计时长），"
+            f"{len(scene["subcaptions"])} 条字幕"
+        )
+        for section in scene["sections"]:
+            print(
+                f"  {timestamp(section["start"]):>8}"
+                f"{section["end"] - section["start"]:>8.1f} 秒  {section["name"]}"
+            )
+
+    if output is None:
+        output = Path("media") / "plans" / f"{project_name}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        dumps(
+            {"project": project_name, "scenes": scenes}, ensure_ascii=False, indent=2
+        ),
+        encoding="utf-8",
+    )
+    print(f"时间线：{output}")
+
+
+def handle_tts_prefetch(project_name: Optional[str] = None, concurrency: int = 8):
+    """
+    并发预先合成项目需要的全部 TTS 音频
+
+    Args:
+        project_name: 项目名称
+        concurrency: 同时进行的合成任务数
+    """
+    if project_name is None:
+        project_name = select_project()
+    validate_project(project_name)
+    if concurrency < 1:
+        raise ValueError("同时进行的合成任务数必须为正整数")
+
+    # pylint: disable=import-outside-toplevel
+    from tts import TTSRequest, prefetch
+
+    print(f"收集 {project_name} 的 TTS 请求……")
+    requests = [TTSRequest(**request) for request in collect_tts_requests(project_name)]
+    cached, synthesized = prefetch(requests, concurrency)
+    print(f"TTS 预取完成：缓存 {cached} 条，新合成 {synthesized} 条")
+
+
+def handle_cache_gc(max_size: int):
+    """
+    整理 TTS 音频缓存，并按最近最少使用的顺序淘汰音频，
+    但不会淘汰现有项目仍在使用的音频
+
+    Args:
+        max_size: 缓存总大小上限（字节）
+    """
+    # pylint: disable=import-outside-toplevel
+    from tts import TTSRequest, collect_garbage
+
+    def protected_keys() -> set[str]:
+        print("收集现有项目使用的 TTS 音频……")
+        return {
+            TTSRequest(**request).cache_key
+            for project_name in get_valid_projects()
+            for request in collect_tts_requests(project_name)
+        }
+
+    evicted, freed = collect_garbage(max_size, protected_keys)
+    print(f"TTS 缓存整理完成：淘汰 {evicted} 个音频，释放 {freed / 1024**2:.1f} MiB")
+
+
+def handle_cache_export(bundle_path: Path):
+    """
+    把 TTS 音频、分段与动画片段缓存打包成一个去重的缓存包
+
+    Args:
+        bundle_path: 缓存包的路径
+    """
+    from bundle import export_bundle  # pylint: disable=import-outside-toplevel
+
+    print("打包缓存……")
+    files, blobs = export_bundle(bundle_path)
+    print(
+        f"缓存包：{bundle_path}（{files} 个文件，去重后 {blobs} 份内容，"
+        f"{bundle_path.stat().st_size / 1024**2:.1f} MiB）"
+    )
+
+
+def handle_cache_import(bundle_path: Path):
+    """
+    从缓存包中恢复本地缺少的缓存文件，已有的文件保持不变
+
+    Args:
+        bundle_path: 缓存包的路径
+    """
+    if not bundle_path.is_file():
+        raise ValueError(f"缓存包 {bundle_path} 不存在")
+
+    from bundle import import_bundle  # pylint: disable=import-outside-toplevel
+
+    restored, skipped = import_bundle(bundle_path)
+    print(f"缓存恢复完成：恢复 {restored} 个文件，跳过已存在的 {skipped} 个")
+
+
+def auto_collect_garbage():
+    """设置了环境变量 AUDIO_CACHE_MAX_SIZE 时，自动整理 TTS 音频缓存"""
+    if max_size := environ.get("AUDIO_CACHE_MAX_SIZE"):
+        handle_cache_gc(parse_size(max_size))
+
+
+def handle_bench(
+    workloads: list[str],
+    repeat: int = 1,
+    threshold: float = 0.1,
+    save_baseline: bool = False,
+):
+    """
+    渲染固定的负载，记录结果并与基线比较
+
+    Args:
+        workloads: 负载名称，为空时渲染全部负载
+        repeat: 每个负载渲染的次数
+        threshold: 墙钟时间比基线增加超过该比例时失败
+        save_baseline: 是否把本次结果保存为基线
+    """
+    # pylint: disable=import-outside-toplevel
+    import bench
+
+    workloads = workloads or list(bench.WORKLOADS)
+    if unknown := [name for name in workloads if name not in bench.WORKLOADS]:
+        raise ValueError(f"未知的负载：{', '.join(unknown)}")
+    if repeat < 1:
+        raise ValueError("渲染次数必须为正整数")
+
+    results = bench.run_suite(workloads, repeat)
+    bench.RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    bench.RESULTS_PATH.write_text(dumps(results, indent=2), encoding="utf-8")
+    baseline = (
+        loads(bench.BASELINE_PATH.read_text(encoding="utf-8"))
+        if bench.BASELINE_PATH.exists()
+        else {"workloads": {}}
+    )
+    passed = bench.compare(results, baseline, threshold)
+    print(f"结果已保存至 {bench.RESULTS_PATH}")
+
+    if save_baseline:
+        # 只更新本次渲染的负载，保留基线中其余负载的结果
+        if baseline.get("quality") == results["quality"]:
+            results["workloads"] = {
+                **baseline["workloads"],
+                **results["workloads"],
+            }
+        bench.BASELINE_PATH.write_text(dumps(results, indent=2), encoding="utf-8")
+        print(f"已保存为基线：{bench.BASELINE_PATH}")
+    elif not passed:
+        raise ValueError("性能低于基线")
+
+
+def handle_bench_startup(budget: float):
+    """
+    测量冷导入 template 的耗时
+
+    Args:
+        budget: 冷导入耗时预算（秒）
+    """
+    # pylint: disable=import-outside-toplevel
+    from bench import check_startup
+
+    if not check_startup(budget):
+        raise ValueError("冷导入 template 未通过检查")
 
 
 MAIN_TEMPLATE = """\"\"\"<PROJECT_NAME> 视频\"\"\"
@@ -250,7 +1238,6 @@ path.append(str(Path(__file__).resolve().parent.parent))
 from template import MaterialDesign, Template
 
 config.background_color = MaterialDesign.SURFACE
-config.max_files_cached = Template.cached_files_num(__file__)
 
 
 class <PROJECT_NAME>Scene(Scene):
@@ -0,0 +1,204 @@
+"""流式混音的旁白音轨（见 template.NarrationMixer）"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from wave import open as open_wave
+
+import av
+import numpy as np
+from av.audio.resampler import AudioResampler
+
+# 写出静音时每次写入的最大采样数
+CHUNK_SAMPLES = 1 << 16
+LAYOUTS = {1: "mono", 2: "stereo"}
+
+
+@dataclass
+class Clip:
+    """
+    音轨中的一段音频
+
+    Attributes:
+        start: 开始时间（秒）
+        duration: 时长（秒）
+        rate: 采样率
+        channels: 声道数
+        gain: 增益（dB）
+        gain_to_background: 播放期间其他音频的增益（dB），None 表示不变
+        path: 音频文件，与 samples 二选一
+        samples: 已解码的 16 位采样，形状为 (采样数, 声道数)
+    """
+
+    start: float
+    duration: float
+    rate: int
+    channels: int
+    gain: float = 0.0
+    gain_to_background: float | None = None
+    path: Path | None = None
+    samples: np.ndarray | None = None
+
+    def decode(self, rate: int, channels: int) -> np.ndarray:
+        """解码并重采样为指定的采样率与声道数，返回形状为 (采样数, 声道数) 的 32 位采样"""
+        resampler = AudioResampler(format="s16", layout=LAYOUTS[channels], rate=rate)
+        chunks = []
+        if self.path is not None:
+            with av.open(str(self.path)) as container:
+                for frame in container.decode(audio=0):
+                    chunks += [f.to_ndarray() for f in resampler.resample(frame)]
+        else:
+            assert self.samples is not None
+            frame = av.AudioFrame.from_ndarray(
+                self.samples.reshape(1, -1), format="s16", layout=LAYOUTS[self.channels]
+            )
+            frame.sample_rate = self.rate
+            chunks += [f.to_ndarray() for f in resampler.resample(frame)]
+        chunks += [f.to_ndarray() for f in resampler.resample(None)]
+        samples = (
+            np.concatenate(chunks, axis=1).reshape(-1, channels).astype(np.int32)
+            if chunks
+            else np.zeros((0, channels), np.int32)
+        )
+        if self.gain:
+            samples = (samples * 10 ** (self.gain / 20)).astype(np.int32)
+        return samples
+
+
+class NarrationTrack:
+    """
+    只记录各段音频的位置，导出时才按时间顺序一次性混音
+
+    manim 每添加一段音频，都会把它叠加到覆盖整个视频的内存音轨上，
+    耗时与内存随视频长度乘以音频段数增长。这里每段音频只在导出时解码一次，
+    内存中只保留与当前位置重叠的音频。
+    """
+
+    def __init__(self):
+        self.clips: list[Clip] = []
+
+    @property
+    def duration_seconds(self) -> float:
+        """音轨时长（秒），与 pydub.AudioSegment 相同"""
+        return max((clip.start + clip.duration for clip in self.clips), default=0.0)
+
+    def add_file(
+        self,
+        path: Path,
+        time: float | None = None,
+        gain: float | None = None,
+        gain_to_background: float | None = None,
+    ):
+        """
+        在 time 秒处添加音频文件，time 为 None 时接在音轨末尾
+
+        Raises:
+            ValueError: 如果 time 为负数，或文件中没有音频时
+        """
+        with av.open(str(path)) as container:
+            if not container.streams.audio:
+                raise ValueError(f"{path} 中没有音频")
+            stream = container.streams.audio[0]
+            duration = (
+                float(stream.duration * stream.time_base)
+                if stream.duration is not None
+                else container.duration / av.time_base
+            )
+            self.clips.append(
+                Clip(
+                    self._start(time),
+                    duration,
+                    stream.rate,
+                    min(stream.channels, 2),
+                    gain or 0.0,
+                    gain_to_background,
+                    path=path,
+                )
+            )
+
+    def add_samples(
+        self,
+        samples: np.ndarray,
+        rate: int,
+        time: float | None = None,
+        gain_to_background: float | None = None,
+    ):
+        """在 time 秒处添加已解码的 16 位采样，形状为 (采样数, 声道数)"""
+        if len(samples) == 0:
+            return
+        self.clips.append(
+            Clip(
+                self._start(time),
+                len(samples) / rate,
+                rate,
+                samples.shape[1],
+                gain_to_background=gain_to_background,
+                samples=samples,
+            )
+        )
+
+    def _start(self, time: float | None) -> float:
+        if time is None:
+            return self.duration_seconds
+        if time < 0:
+            raise ValueError("音频的开始时间不能为负数")
+        return time
+
+    def export(
+        self, out_f, format: str = "wav", **_  # pylint: disable=redefined-builtin
+    ):
+        """
+        混音并写出 16 位 PCM 的 wav 文件，参数与 pydub.AudioSegment.export 相同
+
+        采样率与声道数取各段音频中的最大值。各段音频按开始时间排序后依次解码，
+        叠加到尚未写出的缓冲区中；缓冲区只包含最后一段音频结束前的采样，
+        下一段音频开始之前的部分随即写出。
+        """
+        if format != "wav":
+            raise ValueError(f"旁白音轨只能导出为 wav，而不是 {format}")
+        rate = max((clip.rate for clip in self.clips), default=44100)
+        channels = max((clip.channels for clip in self.clips), default=1)
+
+        with open_wave(str(out_f), "wb") as wave:
+            wave.setnchannels(channels)
+            wave.setsampwidth(2)
+            wave.setframerate(rate)
+
+            def write(samples: np.ndarray):
+                wave.writeframes(
+                    np.clip(samples, -32768, 32767).astype("<i2").tobytes()
+                )
+
+            position = 0  # 已写出的采样数
+            pending = np.zeros((0, channels), np.int32)
+            for clip in sorted(self.clips, key=lambda clip: clip.start):
+                start = round(clip.start * rate)
+                if start >= position + len(pending):
+                    write(pending)
+                    for offset in range(position + len(pending), start, CHUNK_SAMPLES):
+                        write(
+                            np.zeros(
+                                (min(CHUNK_SAMPLES, start - offset), channels), np.int32
+                            )
+                        )
+                    pending = np.zeros((0, channels), np.int32)
+                else:
+                    # 与缓冲区重叠，先写出这段音频开始之前的部分
+                    write(pending[: start - position])
+                    pending = pending[start - position :]
+                position = start
+
+                samples = clip.decode(rate, channels)
+                if len(samples) > len(pending):
+                    pending = np.concatenate(
+                        [
+                            pending,
+                            np.zeros((len(samples) - len(pending), channels), np.int32),
+                        ]
+                    )
+                if clip.gain_to_background is not None:
+                    pending[: len(samples)] = (
+                        pending[: len(samples)] * 10 ** (clip.gain_to_background / 20)
+                    ).astype(np.int32)
+                pending[: len(samples)] += samples
+            write(pending)
+        return out_f
@@ -0,0 +1,150 @@
+"""按分段统计耗时的采样分析器（见 main.py pre/prod --profile）"""
+
+from atexit import register
+from collections import Counter
+from os import environ
+from pathlib import Path
+from sys import _current_frames
+from threading import Event, Thread, main_thread
+from time import perf_counter
+from types import CodeType, FrameType
+
+# 按调用栈从外到内第一个匹配的栈帧（“文件路径:函数名”）归类，
+# 用于回答“时间花在了哪一类工作上”
+CATEGORIES = (
+    ("TTS", ("/tts.py:", "/edge_tts/", "/mutagen/", ":Template.add_tts")),
+    ("文本排版", ("/manimpango/", "/text_mobject.py:", "/svg_mobject.py:")),
+    ("动画插值", ("/manim/animation/",)),
+    ("Cairo 光栅化", ("/manim/camera/",)),
+    ("视频编码", ("/scene_file_writer.py:", "/av/")),
+)
+
+
+class SectionProfiler:
+    """
+    对主线程定时采样调用栈，并把样本归入当前分段
+
+    采样按墙钟时间进行，因此 TTS 的网络等待与重试退避也会计入。
+    结束时写出每个分段的报告（report.txt），以及可用 flamegraph.pl 或
+    speedscope 打开的折叠调用栈（stacks.collapsed），其中分段名为最外层的栈帧。
+    """
+
+    active: "SectionProfiler | None" = None
+
+    def __init__(self, output_dir: Path, interval: float = 0.005):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.section = "载入"
+        self.section_start = perf_counter()
+        self.wall_times: Counter[str] = Counter()
+        self.stacks: dict[str, Counter[tuple[CodeType, ...]]] = {}
+        self._thread_id = main_thread().ident
+        self._stopped = Event()
+        self._thread = Thread(target=self._sample, daemon=True)
+
+    @staticmethod
+    def from_environ() -> "SectionProfiler | None":
+        """设置了环境变量 TEMPLATE_PROFILE 时启动分析器，结束时写入该目录"""
+        if not (output_dir := environ.get("TEMPLATE_PROFILE")):
+            return None
+        profiler = SectionProfiler(Path(output_dir))
+        profiler.start()
+        return profiler
+
+    def start(self):
+        """开始采样"""
+        SectionProfiler.active = self
+        self._thread.start()
+        register(self.stop)
+
+    def enter_section(self, name: str):
+        """之后的样本计入新的分段"""
+        now = perf_counter()
+        self.wall_times[self.section] += now - self.section_start
+        self.section, self.section_start = name, now
+
+    def stop(self):
+        """停止采样并写出报告"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._thread.join()
+        self.enter_section(self.section)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        (self.output_dir / "report.txt").write_text(self.report(), encoding="utf-8")
+        with (self.output_dir / "stacks.collapsed").open("w", encoding="utf-8") as f:
+            for section, stacks in self.stacks.items():
+                for stack, count in stacks.items():
+                    frames = ";".join(_frame_name(code) for code in stack)
+                    f.write(f"{section.replace(";", ",")};{frames} {count}\n")
+
+    def _sample(self):
+        """采样线程"""
+        while not self._stopped.wait(self.interval):
+            frame: FrameType | None = _current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks.setdefault(self.section, Counter())[tuple(stack)] += 1
+
+    def report(self, top: int = 10) -> str:
+        """生成每个分段的耗时报告"""
+        lines = []
+        for section, wall_time in self.wall_times.items():
+            stacks = self.stacks.get(section, Counter())
+            samples = stacks.total()
+            lines.append(f"== {section}：{wall_time:.2f} 秒，{samples} 个样本 ==")
+            if not samples:
+                lines.append("")
+                continue
+
+            categories: Counter[str] = Counter()
+            self_samples: Counter[CodeType] = Counter()
+            total_samples: Counter[CodeType] = Counter()
+            for stack, count in stacks.items():
+                categories[_category(stack)] += count
+                self_samples[stack[-1]] += count
+                for code in set(stack):
+                    total_samples[code] += count
+
+            lines.append(
+                "  分类："
+                + "，".join(
+                    f"{name} {count / samples:.1%}"
+                    for name, count in categories.most_common()
+                )
+            )
+            for title, counter in (
+                ("自身耗时", self_samples),
+                ("累计耗时", total_samples),
+            ):
+                lines.append(f"  {title}最多的函数：")
+                lines.extend(
+                    f"    {count / samples:6.1%}  {_function_name(code)}"
+                    for code, count in counter.most_common(top)
+                )
+            lines.append("")
+        return "\n".join(lines)
+
+
+def _frame_name(code: CodeType) -> str:
+    """折叠调用栈中的栈帧名"""
+    return f"{Path(code.co_filename).stem}:{code.co_qualname}"
+
+
+def _function_name(code: CodeType) -> str:
+    """报告中的函数名"""
+    return f"{code.co_qualname} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def _category(stack: tuple[CodeType, ...]) -> str:
+    """样本的分类"""
+    for code in stack:
+        frame = f"{code.co_filename.replace("\\", "/")}:{code.co_qualname}"
+        for name, patterns in CATEGORIES:
+            if any(pattern in frame for pattern in patterns):
+                return name
+    return "其他"
@@ -0,0 +1,204 @@
+"""由渲染出的母版视频一次解码派生各种输出版本（见 main.py prod --renditions）"""
+
+from dataclasses import dataclass
+from json import dumps, loads
+from pathlib import Path
+from subprocess import run
+
+# 启动屏约 4 秒（见 Template.splash_screen），缩略图与预告片从正文开始取；
+# 视频较短时按实际时长提前（见 derive）
+THUMBNAIL_TIME = 5.0
+TEASER_START = 4.0
+TEASER_DURATION = 6.0
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """
+    一种输出版本
+
+    Attributes:
+        suffix: 输出文件名在母版文件名之后追加的部分
+        filter: 由母版画面得到输出画面的滤镜图，{input} 与 {output} 为输入输出的标签，
+            {name} 为可用于内部标签的前缀，{thumbnail_time} 与 {teaser_start}
+            为按母版时长调整后的缩略图时刻与预告片起点；为 None 时不输出画面
+        args: 输出的编码参数
+        requires_audio: 是否只输出母版的音轨，母版没有音轨时跳过
+    """
+
+    suffix: str
+    filter: str | None
+    args: tuple[str, ...]
+    requires_audio: bool = False
+
+
+RENDITIONS = {
+    "1080p": Rendition(
+        "-1080p.mp4",
+        "[{input}]scale=-2:1080:flags=lanczos[{output}]",
+        (
+            "-map",
+            "0:a?",
+            "-c:v",
+            "libx264",
+            "-crf",
+            "20",
+            "-c:a",
+            "copy",
+            "-movflags",
+            "+faststart",
+        ),
+    ),
+    "720p": Rendition(
+        "-720p.mp4",
+        "[{input}]scale=-2:720:flags=lanczos[{output}]",
+        (
+            "-map",
+            "0:a?",
+            "-c:v",
+            "libx264",
+            "-crf",
+            "22",
+            "-c:a",
+            "copy",
+            "-movflags",
+            "+faststart",
+        ),
+    ),
+    "thumbnail": Rendition(
+        "-thumbnail.jpg",
+        "[{input}]select='gte(t,{thumbnail_time})',scale=-2:720[{output}]",
+        ("-frames:v", "1", "-q:v", "2", "-update", "1"),
+    ),
+    "audio": Rendition(
+        "-narration.m4a",
+        None,
+        ("-map", "0:a", "-c:a", "copy"),
+        requires_audio=True,
+    ),
+    "teaser": Rendition(
+        "-teaser.gif",
+        f"[{{input}}]trim=start={{teaser_start}}:duration={TEASER_DURATION},"
+        "setpts=PTS-STARTPTS,fps=12,scale=480:-2:flags=lanczos,split[{name}a][{name}b];"
+        "[{name}a]palettegen[{name}p];[{name}b][{name}p]paletteuse[{output}]",
+        ("-loop", "0"),
+    ),
+}
+
+
+def probe(movie_path: Path) -> tuple[float, bool]:
+    """母版视频的时长（秒）与是否有音轨"""
+    result = run(
+        [
+            "ffprobe",
+            "-loglevel",
+            "error",
+            "-show_entries",
+            "format=duration:stream=codec_type",
+            "-of",
+            "json",
+            str(movie_path),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    info = loads(result.stdout)
+    return float(info["format"]["duration"]), any(
+        stream.get("codec_type") == "audio" for stream in info.get("streams", [])
+    )
+
+
+def rendition_path(movie_path: Path, name: str) -> Path:
+    """输出版本的路径"""
+    return movie_path.with_name(movie_path.stem + RENDITIONS[name].suffix)
+
+
+def manifest_path(movie_path: Path) -> Path:
+    """输出版本清单的路径"""
+    return movie_path.with_name(movie_path.stem + ".renditions.json")
+
+
+def derive(movie_path: Path, names: list[str]) -> Path:
+    """
+    由母版视频派生输出版本，并在视频旁写入清单
+
+    母版只读取、解码一次：解码后的画面经 split 滤镜分给各个版本，
+    由 ffmpeg 在同一进程中并行编码；音频版本直接复制母版的音轨。
+    母版短于默认的缩略图时刻或预告片区间时，两者按母版时长提前，以免输出为空；
+    母版没有音轨时跳过只输出音轨的版本，并在清单中记录。
+
+    Args:
+        movie_path: 母版视频
+        names: 输出版本的名称（见 RENDITIONS）
+
+    Returns:
+        Path: 清单的路径
+    """
+    duration, has_audio = probe(movie_path)
+    skipped = [
+        name for name in names if RENDITIONS[name].requires_audio and not has_audio
+    ]
+    names = [name for name in names if name not in skipped]
+    thumbnail_time = min(THUMBNAIL_TIME, duration / 2)
+    teaser_start = max(0.0, min(TEASER_START, duration - TEASER_DURATION))
+    outputs: list[str] = []
+    filters: list[str] = []
+    video_names = [name for name in names if RENDITIONS[name].filter is not None]
+    if video_names:
+        filters.append(
+            f"[0:v]split={len(video_names)}"
+            + "".join(f"[in{index}]" for index in range(len(video_names)))
+        )
+    for name in names:
+        rendition = RENDITIONS[name]
+        if rendition.filter is not None:
+            index = video_names.index(name)
+            filters.append(
+                rendition.filter.format(
+                    input=f"in{index}",
+                    output=f"out{index}",
+                    name=f"r{index}",
+                    thumbnail_time=f"{thumbnail_time:.3f}",
+                    teaser_start=f"{teaser_start:.3f}",
+                )
+            )
+            outputs += ["-map", f"[out{index}]"]
+        outputs += [*rendition.args, str(rendition_path(movie_path, name))]
+
+    if names:
+        run(
+            [
+                "ffmpeg",
+                "-loglevel",
+                "error",
+                "-y",
+                "-i",
+                str(movie_path),
+                *(["-filter_complex", ";".join(filters)] if filters else []),
+                *outputs,
+            ],
+            check=True,
+        )
+
+    manifest = manifest_path(movie_path)
+    manifest.write_text(
+        dumps(
+            {
+                "master": movie_path.name,
+                "renditions": [
+                    {
+                        "name": name,
+                        "file": rendition_path(movie_path, name).name,
+                        "bytes": rendition_path(movie_path, name).stat().st_size,
+                    }
+                    for name in names
+                ],
+                "skipped": skipped,
+            },
+            ensure_ascii=False,
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    return manifest
@@ -0,0 +1,162 @@
+"""分段视频的内容寻址存储与拼接"""
+
+from json import dumps, loads
+from os import getpid
+from pathlib import Path
+from shutil import copyfile, move
+from subprocess import run
+from tempfile import TemporaryDirectory
+
+STORE_DIR = Path(__file__).resolve().parent / "media" / "segments"
+
+
+def segment_video(key: str) -> Path:
+    """分段视频的路径"""
+    return STORE_DIR / f"{key}.mp4"
+
+
+def load_segment(key: str) -> dict | None:
+    """读取已存储分段的信息，分段不存在时返回 None"""
+    meta_path = STORE_DIR / f"{key}.json"
+    if not meta_path.exists() or not segment_video(key).exists():
+        return None
+    return loads(meta_path.read_text(encoding="utf-8"))
+
+
+def save_segment(key: str, video_path: Path, meta: dict):
+    """存储分段视频及其信息"""
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    # 批量渲染时多个项目可能同时存储同一个共用分段，先写入临时文件再替换，
+    # 使读取方不会读到写了一半的文件
+    temp_video = STORE_DIR / f"{key}.{getpid()}.part"
+    copyfile(video_path, temp_video)
+    temp_video.replace(segment_video(key))
+    temp_meta = STORE_DIR / f"{key}.json.{getpid()}.part"
+    temp_meta.write_text(dumps(meta, ensure_ascii=False), encoding="utf-8")
+    temp_meta.replace(STORE_DIR / f"{key}.json")
+
+
+def save_partial_movies(key: str, partial_movies: list[str], meta: dict):
+    """
+    把一个分段的动画片段无损拼接后存储
+
+    Args:
+        key: 分段的内容哈希
+        partial_movies: 分段内各个动画的视频文件（manim 的 partial movie files）
+        meta: 分段信息
+    """
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    with TemporaryDirectory(dir=STORE_DIR) as temp_dir:
+        file_list = Path(temp_dir) / "partial_movies.txt"
+        file_list.write_text(
+            "".join(f"file '{Path(file).as_posix()}'\n" for file in partial_movies),
+            encoding="utf-8",
+        )
+        video_path = Path(temp_dir) / f"{key}.mp4"
+        concat(file_list, video_path)
+        save_segment(key, video_path, meta)
+
+
+def concat(file_list: Path, output_path: Path, *inputs: str):
+    """
+    用 ffmpeg 的 concat 分离器无损拼接视频
+
+    Args:
+        file_list: concat 文件列表
+        output_path: 输出视频的路径
+        inputs: 其余的 ffmpeg 参数，如另外的音频输入
+    """
+    run(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            str(file_list),
+            *inputs,
+            str(output_path),
+        ],
+        check=True,
+    )
+
+
+def splice(record_path: Path, store_all: bool = True):
+    """
+    根据渲染记录存储新渲染的分段，并把复用的分段拼接回最终视频
+
+    渲染记录由 Template 在渲染时写入（见 Template.next_section）。
+    本次渲染的分段视频由 manim 的 --save_sections 生成；
+    被跳过的分段从存储中取出，与新分段按顺序拼接成画面，
+    再与完整的音轨（Template 导出的音频，或 manim 输出视频中的音轨）合并，
+    替换原来的输出视频。
+
+    Args:
+        record_path: 渲染记录的路径
+        store_all: 是否存储所有新渲染的分段，否则只存储 shared 的分段
+
+    Raises:
+        ValueError: 如果渲染记录与 manim 的分段不一致时
+    """
+    record = loads(record_path.read_text(encoding="utf-8"))
+    segments: list[dict] = record["segments"]
+    sections_dir = Path(record["sections_dir"])
+
+    for segment in segments:
+        if segment["reused"] or segment["video"] is None:
+            continue
+        if not (store_all or segment["shared"]) or load_segment(segment["key"]):
+            continue
+        video_path = sections_dir / segment["video"]
+        if video_path.exists():
+            save_segment(
+                segment["key"],
+                video_path,
+                {
+                    "name": segment["name"],
+                    "duration": segment["end"] - segment["start"],
+                    "tts": segment["tts"],
+                },
+            )
+
+    if not any(segment["reused"] for segment in segments):
+        return
+    if not record["complete"]:
+        raise ValueError("场景中有未经 Template.next_section 创建的分段，无法增量渲染")
+
+    movie_path = Path(record["movie"])
+    with TemporaryDirectory() as temp_dir:
+        file_list = Path(temp_dir) / "segments.txt"
+        with file_list.open("w", encoding="utf-8") as f:
+            for segment in segments:
+                if segment["reused"]:
+                    video_path = segment_video(segment["key"])
+                elif segment["video"] is not None:
+                    video_path = sections_dir / segment["video"]
+                else:
+                    continue  # 没有画面的分段
+                f.write(f"file '{video_path.as_posix()}'\n")
+
+        spliced_path = Path(temp_dir) / movie_path.name
+        if record.get("audio"):
+            # 音轨由 Template 另外导出，需要重新编码
+            audio = [
+                "-i",
+                record["audio"],
+                "-map",
+                "0:v",
+                "-map",
+                "1:a",
+                "-c:v",
+                "copy",
+            ]
+        else:
+            audio = ["-i", str(movie_path), "-map", "0:v", "-map", "1:a?", "-c", "copy"]
+        concat(file_list, spliced_path, *audio)
+        movie_path.parent.mkdir(parents=True, exist_ok=True)
+        move(spliced_path, movie_path)
+    print(f"已拼接复用的分段：{movie_path}")
@@ -1,13 +1,23 @@
 """模版与实用工具类"""
 
-from json import dumps
-from os import environ
+from json import dumps, loads
+from os import environ, getpid, utime
+from queue import Queue
+from threading import Thread
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import asdict
 from zlib import crc32
-from time import sleep
+from time import perf_counter
 from hashlib import blake2b
+from pickle import dump, load, HIGHEST_PROTOCOL, PickleError
+from functools import cache, wraps
+from inspect import getfile
+from atexit import register
+from typing import Any
 
+import av
+import manimpango
+import numpy as np
 from manim import (
     Scene,
     ImageMobject,
@@ -17,62 +27,586 @@ from manim import (
     Annulus,
     config,
     FadeIn,
+    LaggedStart,
     PI,
     Arc,
     TAU,
     Create,
     ORIGIN,
+    SVGMobject,
+    Text,
+    MarkupText,
+    Mobject,
+    VMobject,
+    logger,
+    __version__ as manim_version,
 )
-from edge_tts import Communicate
-from mutagen.mp3 import MP3, HeaderNotFoundError
+from manim.scene.scene_file_writer import SceneFileWriter, to_av_frame_rate
+from manim.utils.hashing import get_hash_from_play_call
+from manim.utils.sounds import get_full_sound_file_path
+from pydub import AudioSegment
 
+from design import MaterialDesign
+from events import emit
+from narration import NarrationTrack
+from profiling import SectionProfiler
+from segments import load_segment, save_partial_movies
+from tts import (
+    TTSRequest,
+    cached_duration,
+    client_stats,
+    estimate_duration,
+    get_backend,
+)
+
+
+class TextGeometryCache:
+    """
+    持久化的文本几何缓存
+
+    Text 与 MarkupText 由 Pango 排版成 SVG 后，还要解析 SVG 才能得到路径，
+    相同的输入每次都会得到相同的结果。缓存以 SVG 文件名（manim 根据文本、字体、字号、
+    行距、t2c、渐变等参数计算的哈希）、SVG 解析参数与 manim 版本为键，
+    保存解析得到的子对象，命中时直接载入，跳过 SVG 解析与路径构建。
+    """
+
+    CACHE_DIR = Path(__file__).resolve().parent / "media" / "text_geometry"
+
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def cache_key(mobject: SVGMobject) -> str:
+        """缓存键"""
+        return blake2b(
+            repr(
+                (
+                    type(mobject).__name__,
+                    Path(mobject.file_name).stem,
+                    mobject.svg_default,
+                    mobject.path_string_config,
+                    config.renderer,
+                    manim_version,
+                )
+            ).encode(),
+            digest_size=16,
+        ).hexdigest()
+
+    @classmethod
+    def install(cls):
+        """替换 SVGMobject.generate_mobject，使文本对象经过缓存"""
+        generate_mobject = SVGMobject.generate_mobject
+        if getattr(generate_mobject, "text_geometry_cache", False):
+            return
+
+        def cached_generate_mobject(mobject: SVGMobject):
+            if not isinstance(mobject, (Text, MarkupText)):
+                generate_mobject(mobject)
+                return
+
+            cache_path = cls.CACHE_DIR / f"{cls.cache_key(mobject)}.pickle"
+            try:
+                with cache_path.open("rb") as f:
+                    mobject.add(*load(f))
+                cls.hits += 1
+                return
+            except FileNotFoundError:
+                pass
+            except (PickleError, EOFError, AttributeError, ImportError):
+                cache_path.unlink(missing_ok=True)
+
+            cls.misses += 1
+            generate_mobject(mobject)
+            cls.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_suffix(f".{getpid()}.part")
+            try:
+                with temp_path.open("wb") as f:
+                    dump(mobject.submobjects, f, HIGHEST_PROTOCOL)
+                temp_path.replace(cache_path)
+            except (PickleError, TypeError, AttributeError):
+                temp_path.unlink(missing_ok=True)
+
+        cached_generate_mobject.text_geometry_cache = True  # type: ignore
+        SVGMobject.generate_mobject = cached_generate_mobject  # type: ignore
+
+
+class FontRegistry:
+    """
+    直接从 assets/fonts 为进程注册场景用到的字体族，不依赖系统安装的字体
+
+    默认字体在导入时注册，其他字体族在第一次创建使用它的 Text 或 MarkupText 时注册，
+    每个字体族只注册一次。fontconfig 的缓存写入 media/fontconfig，
+    在没有系统字体缓存的环境（如 CI）中，之后的渲染不必重新扫描系统字体。
+    """
+
+    FONTS_DIR = Path(__file__).resolve().parent / "assets" / "fonts"
+    CACHE_DIR = Path(__file__).resolve().parent / "media" / "fontconfig"
+
+    # 字体族与其字体文件（相对于 assets/fonts）。只注册静态字体：
+    # 可变字体（文件名含 [wght]）与静态字体属于同一字体族，同时注册会出现重复的字形。
+    # HarmonyOS Sans SC 不随仓库分发，需放入 assets/fonts/harmonyos-sans-sc/
+    # （官方发布的文件名为 HarmonyOS_Sans_SC_*.ttf 或 HarmonyOS_SansSC_*.ttf）
+    FAMILIES = {
+        "HarmonyOS Sans SC": "harmonyos-sans-sc/HarmonyOS_Sans*SC_*.ttf",
+        "JetBrains Mono": "jetbrains-mono/JetBrainsMono-*.ttf",
+    }
+
+    registered: set[str] = set()
+
+    @classmethod
+    def configure(cls):
+        """让 fontconfig 在原有配置之外把缓存写入 media/fontconfig（已指定配置文件时不变）"""
+        if environ.get("FONTCONFIG_FILE"):
+            return
+        cls.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        config_path = cls.CACHE_DIR / "fonts.conf"
+        content = (
+            '<?xml version="1.0"?>\n'
+            '<!DOCTYPE fontconfig SYSTEM "urn:fontconfig:fonts.dtd">\n'
+            "<fontconfig>\n"
+            f"  <cachedir>{cls.CACHE_DIR / "cache"}</cachedir>\n"
+            '  <include ignore_missing="yes">/etc/fonts/fonts.conf</include>\n'
+            "</fontconfig>\n"
+        )
+        if not config_path.exists() or config_path.read_text("utf-8") != content:
+            config_path.write_text(content, "utf-8")
+        environ["FONTCONFIG_FILE"] = str(config_path)
+
+    @classmethod
+    def register(cls, family: str):
+        """注册字体族的字体文件；不在 FAMILIES 中或没有字体文件（会警告）时使用系统字体"""
+        if family in cls.registered or family not in cls.FAMILIES:
+            return
+        cls.registered.add(family)
+        paths = [
+            path
+            for path in sorted(cls.FONTS_DIR.glob(cls.FAMILIES[family]))
+            if "[" not in path.name
+        ]
+        if not paths:
+            logger.warning(
+                "assets/fonts 中没有字体族 %s 的字体文件（%s），将使用系统字体",
+                family,
+                cls.FAMILIES[family],
+            )
+            return
+        for path in paths:
+            manimpango.register_font(str(path))
+        # Text 缓存了可用字体的列表，用于检查字体是否存在
+        Text.font_list.cache_clear()
+        MarkupText.font_list.cache_clear()
+
+    @classmethod
+    def install(cls):
+        """注册默认字体，并在创建 Text 与 MarkupText 之前注册其字体族"""
+        cls.configure()
+        cls.register(Template.DEFAULT_FONT)
+
+        for text_class in (Text, MarkupText):
+            init = text_class.__init__
+            if getattr(init, "template_fonts", False):
+                continue
+
+            def wrap(init):
+                @wraps(init)
+                def __init__(mobject, *args, **kwargs):
+                    if font := kwargs.get("font"):
+                        cls.register(font)
+                    init(mobject, *args, **kwargs)
+
+                __init__.template_fonts = True  # type: ignore
+                return __init__
+
+            # Mobject.set_default() 不带参数时恢复 _original__init__
+            text_class.__init__ = wrap(init)  # type: ignore
+            setattr(text_class, "_original__init__", text_class.__init__)
+
+
+class PartialMovieEncoder:
+    """
+    按环境变量 TEMPLATE_ENCODING 中的编码配置（见 encoding.py）编码动画片段
+
+    manim 写死了动画片段的编码器与参数（libx264，crf 23），这里替换
+    SceneFileWriter.open_partial_movie_stream，其余步骤与 manim 相同。
+    编码参数不计入 manim 的动画哈希，因此片段缓存按编码参数放在不同的目录中。
+    """
+
+    @staticmethod
+    def install():
+        """设置了编码配置时替换 SceneFileWriter.open_partial_movie_stream"""
+        if not (settings := environ.get("TEMPLATE_ENCODING")):
+            return
+        open_stream = SceneFileWriter.open_partial_movie_stream
+        if getattr(open_stream, "template_encoding", False):
+            return
+        encoder = loads(settings)
+        digest = blake2b(settings.encode(), digest_size=4).hexdigest()
+        config.partial_movie_dir = (
+            f"{{video_dir}}/partial_movie_files/{{scene_name}}-{digest}"
+        )
+
+        def open_partial_movie_stream(file_writer: SceneFileWriter, file_path=None):
+            # 透明背景与 webm 使用其他编码器，保持 manim 的设置
+            if config.transparent or config.movie_file_extension != ".mp4":
+                open_stream(file_writer, file_path)
+                return
+            if file_path is None:
+                file_path = file_writer.partial_movie_files[
+                    file_writer.renderer.num_plays
+                ]
+            file_writer.partial_movie_file_path = file_path
+
+            options = {"an": "1", "crf": str(encoder["crf"])}
+            if encoder["preset"]:
+                options["preset"] = encoder["preset"]
+            with av.open(file_path, mode="w") as video_container:
+                stream = video_container.add_stream(
+                    encoder["codec"],
+                    rate=to_av_frame_rate(config.frame_rate),
+                    options=options,
+                )
+                stream.pix_fmt = "yuv420p"
+                stream.width = config.pixel_width
+                stream.height = config.pixel_height
+                if encoder["threads"]:
+                    stream.codec_context.thread_count = encoder["threads"]
+
+                file_writer.video_container = video_container
+                file_writer.video_stream = stream
+                file_writer.queue = Queue()
+                file_writer.writer_thread = Thread(target=file_writer.listen_and_write)
+                file_writer.writer_thread.start()
+
+        open_partial_movie_stream.template_encoding = True  # type: ignore
+        SceneFileWriter.open_partial_movie_stream = open_partial_movie_stream  # type: ignore
+
+
+class PartialMovieCache:
+    """
+    按项目的字节预算与最近使用时间管理 manim 的动画片段缓存
+
+    manim 按文件数淘汰每个场景目录中最久未访问的片段，上限需要为每个项目手工估计，
+    场景的动画数超过上限时，本次渲染的片段也会被淘汰，下次又要重新渲染。
+    这里替换 SceneFileWriter.clean_cache：本次渲染用到的片段（数量即场景实际的动画数）总是保留，
+    并更新其修改时间作为最近使用时间；随后统计本项目的所有片段目录（每个目录中的 .project
+    记录所属项目），超出预算（环境变量 TEMPLATE_MOVIE_CACHE_SIZE，字节）时
+    按最近使用时间从旧到新淘汰片段。只淘汰本项目的片段：main.py batch 中各项目并行渲染，
+    其他项目已判定命中、尚未合成的片段不能删除。渲染结束时打印并发出命中与未命中的片段数。
+    """
+
+    DEFAULT_SIZE = 2 * 1024**3
+    PROJECT_FILE = ".project"
+
+    @staticmethod
+    def budget() -> int:
+        """每个项目的片段缓存大小上限（字节）"""
+        size = environ.get("TEMPLATE_MOVIE_CACHE_SIZE")
+        return int(size) if size else PartialMovieCache.DEFAULT_SIZE
+
+    @staticmethod
+    def evict(
+        media_dir: Path, project: str, budget: int, keep: set[Path]
+    ) -> tuple[int, int]:
+        """
+        项目的片段超出预算时淘汰其中最久未使用的片段
+
+        Args:
+            media_dir: 媒体目录
+            project: 项目名称，只统计与淘汰属于该项目的片段目录
+            budget: 每个项目的片段缓存大小上限（字节）
+            keep: 不可淘汰的片段
+
+        Returns:
+            tuple[int, int]: 淘汰的片段数与释放的字节数
+        """
+        entries: list[tuple[float, int, Path]] = []
+        for partial_dir in media_dir.glob("videos/*/*/partial_movie_files/*"):
+            project_file = partial_dir / PartialMovieCache.PROJECT_FILE
+            if (
+                not project_file.exists()
+                or project_file.read_text("utf-8").strip() != project
+            ):
+                continue
+            for path in partial_dir.glob("*.mp4"):
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        evicted = freed = 0
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= budget:
+                break
+            if path in keep:
+                continue
+            path.unlink(missing_ok=True)
+            total_size -= size
+            evicted += 1
+            freed += size
+        return evicted, freed
+
+    @staticmethod
+    def install():
+        """替换 SceneFileWriter.clean_cache，并统计 is_already_cached 的结果"""
+        if getattr(SceneFileWriter.clean_cache, "template_movie_cache", False):
+            return
+        is_already_cached = SceneFileWriter.is_already_cached
+
+        def counted_is_already_cached(file_writer: SceneFileWriter, hash_invocation):
+            cached = is_already_cached(file_writer, hash_invocation)
+            if cached:
+                file_writer.template_cache_hits = (  # type: ignore
+                    getattr(file_writer, "template_cache_hits", 0) + 1
+                )
+            return cached
+
+        def clean_cache(file_writer: SceneFileWriter):
+            project = Path(config.input_file).parent.name
+            project_file = (
+                file_writer.partial_movie_directory / PartialMovieCache.PROJECT_FILE
+            )
+            project_file.write_text(project, "utf-8")
+            # 每次未跳过的动画调用一次 is_already_cached 并记录一个片段，
+            # 重复的动画（如相同的 wait）各自计数，与命中数一致
+            files = [file for file in file_writer.partial_movie_files if file]
+            used = {Path(file).resolve() for file in files}
+            for path in used:
+                if path.exists():
+                    utime(path)
+
+            evicted, freed = PartialMovieCache.evict(
+                Path(config.media_dir).resolve(),
+                project,
+                PartialMovieCache.budget(),
+                used,
+            )
+            hits = getattr(file_writer, "template_cache_hits", 0)
+            misses = max(len(files) - hits, 0)
+            print(
+                f"动画片段缓存：命中 {hits} 个，渲染 {misses} 个，"
+                f"淘汰 {evicted} 个（{freed / 1024**2:.1f} MiB）"
+            )
+            emit(
+                "movie_cache",
+                project=project,
+                hits=hits,
+                misses=misses,
+                evicted=evicted,
+                freed=freed,
+            )
+
+        clean_cache.template_movie_cache = True  # type: ignore
+        SceneFileWriter.is_already_cached = counted_is_already_cached  # type: ignore
+        SceneFileWriter.clean_cache = clean_cache  # type: ignore
+
+
+class NarrationMixer:
+    """
+    用流式混音的旁白音轨（见 narration.NarrationTrack）替换 manim 的内存音轨
+
+    替换 SceneFileWriter.add_sound 与 add_audio_segment：添加音频时只记录位置，
+    file_writer.audio_segment 换成 NarrationTrack，manim 合成视频时调用其 export，
+    由各段音频一次性混音出完整的音轨。
+    """
+
+    @staticmethod
+    def track(file_writer: SceneFileWriter) -> NarrationTrack:
+        """场景的旁白音轨"""
+        if not isinstance(getattr(file_writer, "audio_segment", None), NarrationTrack):
+            file_writer.audio_segment = NarrationTrack()  # type: ignore
+            file_writer.includes_sound = True
+        return file_writer.audio_segment  # type: ignore
+
+    @staticmethod
+    def install():
+        """替换 SceneFileWriter.add_sound 与 add_audio_segment"""
+        if getattr(SceneFileWriter.add_sound, "template_narration", False):
+            return
+
+        def add_sound(
+            file_writer: SceneFileWriter,
+            sound_file: str,
+            time: float | None = None,
+            gain: float | None = None,
+            gain_to_background: float | None = None,
+        ):
+            NarrationMixer.track(file_writer).add_file(
+                get_full_sound_file_path(sound_file), time, gain, gain_to_background
+            )
+
+        def add_audio_segment(
+            file_writer: SceneFileWriter,
+            new_segment: AudioSegment,
+            time: float | None = None,
+            gain_to_background: float | None = None,
+        ):
+            segment = new_segment.set_sample_width(2)
+            NarrationMixer.track(file_writer).add_samples(
+                np.array(segment.get_array_of_samples(), np.int16).reshape(
+                    -1, segment.channels
+                ),
+                segment.frame_rate,
+                time,
+                gain_to_background,
+            )
 
-@dataclass
-class MaterialDesign:
-    """Material 3 设计"""
+        add_sound.template_narration = True  # type: ignore
+        SceneFileWriter.add_sound = add_sound  # type: ignore
+        SceneFileWriter.add_audio_segment = add_audio_segment  # type: ignore
 
-    PRIMARY = "#E2B7F4"
-    ON_PRIMARY = "#000000"
-    PRIMARY_CONTAINER = "#5B396D"
-    ON_PRIMARY_CONTAINER = "#F6D9FF"
 
-    SECONDARY = "#D3C0D8"
-    ON_SECONDARY = "#000000"
-    SECONDARY_CONTAINER = "#504255"
-    ON_SECONDARY_CONTAINER = "#F0DCF4"
+class FadeToOpacity(Animation):
+    """
+    把多个对象的不透明度一起渐变到 opacity，
+    效果与对每个对象分别播放 mobject.animate.set_opacity(opacity) 相同
 
-    TERTIARY = "#F5B7B7"
-    ON_TERTIARY = "#000000"
-    TERTIARY_CONTAINER = "#663B3B"
-    ON_TERTIARY_CONTAINER = "#FFDAD9"
+    .animate 会为每个对象深拷贝出起止状态并逐个插值。这里在开始时把所有子对象的
+    颜色数组合并到同一块内存中，各子对象只保留其中的视图，
+    之后每一帧只需对这块内存做一次数组运算，开销随对象数线性增长。
+    """
 
-    SURFACE = "#161217"
-    ON_SURFACE = "#FFFFFF"
-    SURFACE_VARIANT = "#4B444D"
-    ON_SURFACE_VARIANT = "#FFFFFF"
+    COLOR_ARRAYS = ("fill_rgbas", "stroke_rgbas", "background_stroke_rgbas")
 
-    OUTLINE = "#F8EDF7"
-    OUTLINE_VARIANT = "#CABFCA"
+    def __init__(self, *mobjects: Mobject, opacity: float, **kwargs):
+        if not mobjects:
+            raise ValueError("至少需要一个对象")
+        self.mobjects = mobjects
+        self.opacity = opacity
+        self.rgbas = np.zeros((0, 4))
+        self.start_opacities = np.zeros(0)
+        super().__init__(mobjects[0], **kwargs)
 
-    ERROR = "#FFECE9"
-    ON_ERROR = "#000000"
-    ERROR_CONTAINER = "#FFAEA4"
-    ON_ERROR_CONTAINER = "#220001"
+    def _setup_scene(self, scene: Scene):
+        # 场景按 self.mobject 判断哪些对象在动：它及其之后的对象每帧重绘，之前的画进静态背景。
+        # 取场景中最靠前的对象，使所有对象都每帧重绘，又不必向场景添加新的对象组
+        super()._setup_scene(scene)
+        order = {
+            id(mobject): i
+            for i, mobject in enumerate(scene.get_mobject_family_members())
+        }
+        self.mobject = min(
+            self.mobjects, key=lambda mobject: order.get(id(mobject), len(order))
+        )
+
+    def begin(self):
+        vmobjects = {
+            id(submobject): submobject
+            for mobject in self.mobjects
+            for submobject in mobject.get_family()
+            if isinstance(submobject, VMobject)
+        }.values()
+        arrays = [
+            (vmobject, name) for vmobject in vmobjects for name in self.COLOR_ARRAYS
+        ]
+        self.rgbas = np.concatenate(
+            [getattr(vmobject, name) for vmobject, name in arrays]
+        )
+        offset = 0
+        for vmobject, name in arrays:
+            length = len(getattr(vmobject, name))
+            setattr(vmobject, name, self.rgbas[offset : offset + length])
+            offset += length
+        self.start_opacities = self.rgbas[:, 3].copy()
+        super().begin()
+
+    def create_starting_mobject(self) -> Mobject:
+        # 起始状态只需要各子对象的不透明度，见 begin
+        return Mobject()
+
+    def interpolate_mobject(self, alpha: float):
+        self.rgbas[:, 3] = self.start_opacities + (
+            self.opacity - self.start_opacities
+        ) * self.rate_func(alpha)
+
+
+class TimelinePlanner:
+    """
+    不渲染视频，记录场景的时间线（见 main.py plan）
+
+    设置了环境变量 TEMPLATE_PLAN 时，所有分段都跳过渲染，add_tts 只返回缓存或估计的时长。
+    这里包装 Scene.play 记录每次动画，场景结束时把分段、动画、旁白与字幕
+    作为一行 JSON 追加到 TEMPLATE_PLAN 文件中。
+    """
+
+    @staticmethod
+    def active() -> bool:
+        """是否正在记录时间线"""
+        return bool(environ.get("TEMPLATE_PLAN"))
 
-    SURFACE_DIM = "#161217"
-    SURFACE_BRIGHT = "#544E54"
-    SURFACE_CONTAINER_LOWEST = "#000000"
-    SURFACE_CONTAINER_LOW = "#221E24"
-    SURFACE_CONTAINER = "#342F35"
-    SURFACE_CONTAINER_HIGH = "#3F3A40"
-    SURFACE_CONTAINER_HIGHEST = "#4A454B"
+    @staticmethod
+    def timeline(scene: Scene) -> dict[str, list[dict]]:
+        """场景的时间线，第一次获取时创建，并在场景结束后写出"""
+        if not hasattr(scene, "template_timeline"):
+            scene.template_timeline = {  # type: ignore
+                "sections": [],
+                "plays": [],
+                "narration": [],
+            }
+            register(TimelinePlanner._write, scene)
+        return scene.template_timeline  # type: ignore
+
+    @staticmethod
+    def current_section(scene: Scene) -> str | None:
+        """当前分段的名称"""
+        sections = TimelinePlanner.timeline(scene)["sections"]
+        return sections[-1]["name"] if sections else None
+
+    @staticmethod
+    def install():
+        """记录时间线时包装 Scene.play"""
+        if not TimelinePlanner.active() or getattr(Scene.play, "template_plan", False):
+            return
+        scene_play = Scene.play
 
-    INVERSE_SURFACE = "#E9E0E7"
-    INVERSE_ON_SURFACE = "#000000"
-    INVERSE_PRIMARY = "#5C3A6E"
+        @wraps(scene_play)
+        def play(scene: Scene, *args, **kwargs):
+            start = scene.time
+            scene_play(scene, *args, **kwargs)
+            plays = TimelinePlanner.timeline(scene)["plays"]
+            plays.append(
+                {
+                    "index": len(plays),
+                    "section": TimelinePlanner.current_section(scene),
+                    "start": start,
+                    "run_time": scene.time - start,
+                    "animations": [
+                        type(animation).__name__ for animation in scene.animations or []
+                    ],
+                }
+            )
 
-    SHADOW = "#000000"
-    SCRIM = "#000000"
+        play.template_plan = True  # type: ignore
+        Scene.play = play  # type: ignore
+
+    @staticmethod
+    def _write(scene: Scene):
+        timeline = TimelinePlanner.timeline(scene)
+        sections = timeline["sections"]
+        for section, following in zip(sections, sections[1:] + [None]):
+            section["end"] = following["start"] if following else scene.time
+        with Path(environ["TEMPLATE_PLAN"]).open("a", encoding="utf-8") as f:
+            f.write(
+                dumps(
+                    {
+                        "scene": type(scene).__name__,
+                        "project": Path(config.input_file).parent.name,
+                        "duration": scene.time,
+                        "pixel_width": config.pixel_width,
+                        "pixel_height": config.pixel_height,
+                        "frame_rate": config.frame_rate,
+                        **timeline,
+                        "subcaptions": [
+                            {
+                                "content": subcaption.content,
+                                "start": subcaption.start.total_seconds(),
+                                "end": subcaption.end.total_seconds(),
+                            }
+                            for subcaption in scene.renderer.file_writer.subcaptions
+                        ],
+                    },
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
 
 
 class Template:
@@ -82,21 +616,240 @@ class Template:
     DEFAULT_VOICE = "zh-CN-YunyangNeural"
 
     @staticmethod
-    def cached_files_num(filename: str):
-        """获取缓存文件数量"""
-        if environ.get("GITHUB_ACTIONS") == "true":
-            return -1
+    def render_job() -> tuple[int, int] | None:
+        """获取并行渲染时本进程的任务编号与任务总数"""
+        job = environ.get("TEMPLATE_JOB")
+        if not job:
+            return None
+        index, total = job.split("/")
+        return int(index), int(total)
+
+    @staticmethod
+    def next_section(scene: Scene, name: str, *dependencies: Any, shared: bool = False):
+        """
+        开始新的分段
+
+        并行渲染时，每个分段按序号轮流分配给各个渲染进程，
+        不属于本进程的分段会被跳过，只计算状态而不光栅化。
+
+        记录分段（环境变量 TEMPLATE_SEGMENTS）或增量渲染（环境变量 TEMPLATE_INCREMENTAL）时，
+        分段以其输入计算内容哈希：模版与场景所在文件的代码、分段开始时画面上的对象、
+        dependencies 中的数据以及渲染参数。场景从其他模块（如 data.py）读取的数据
+        不在哈希中，需把分段实际用到的部分（如 ARIA_ATTRIBUTES_DATA 的条目）作为
+        dependencies 传入，修改数据时只有用到它的分段失效。
+        增量渲染时，输入与所用 TTS 音频都未变化且已存储的分段会被跳过，
+        渲染结束后再从存储中拼接回视频（见 segments.splice）。
 
-        match Path(filename).resolve().parent.name:
-            case "ARIAAttr":
-                return 257
-            case _:
-                return 100
+        shared 的分段（如启动屏与结束屏）与项目代码无关，其哈希不含项目代码，
+        因此所有项目共用同一份存储；记录分段时即使不是增量渲染也会复用。
+        失败重试时（环境变量 TEMPLATE_RESUME）同样复用上次保存了检查点的分段。
+        """
+        if SectionProfiler.active is not None:
+            SectionProfiler.active.enter_section(name)
+
+        index = getattr(scene, "template_section_index", -1) + 1
+        scene.template_section_index = index  # type: ignore
+        if index == 0:
+            register(Template._emit_movie, scene)
+        Template._finish_segment(scene)
+        Template._finish_section(scene)
+
+        # 记录时间线时跳过所有分段
+        skip_animations = TimelinePlanner.active()
+        if skip_animations:
+            TimelinePlanner.timeline(scene)["sections"].append(
+                {"name": name, "shared": shared, "start": scene.time}
+            )
+        if (job := Template.render_job()) is not None:
+            job_index, job_total = job
+            skip_animations = skip_animations or index % job_total != job_index
+
+        segment = None
+        if environ.get("TEMPLATE_SEGMENTS") or environ.get("TEMPLATE_INCREMENTAL"):
+            key = Template.segment_key(scene, name, dependencies, shared)
+            stored = (
+                load_segment(key)
+                if shared
+                or environ.get("TEMPLATE_INCREMENTAL")
+                or environ.get("TEMPLATE_RESUME")
+                else None
+            )
+            reused = stored is not None and all(
+                cached_duration(TTSRequest(**tts["request"])) == tts["duration"]
+                for tts in stored["tts"]
+            )
+            skip_animations = skip_animations or reused
+            segment = {
+                "index": index,
+                "name": name,
+                "key": key,
+                "shared": shared,
+                "reused": reused,
+                "video": None,
+                "start": scene.renderer.time,
+                "end": None,
+                "stored_duration": stored["duration"] if reused else None,
+                "tts": [],
+            }
+
+        scene.next_section(name, skip_animations=skip_animations)
+        scene.template_section = (name, skip_animations, perf_counter())  # type: ignore
+
+        if segment is not None:
+            segment["video"] = scene.renderer.file_writer.sections[-1].video
+            if not hasattr(scene, "template_segments"):
+                # 分段之前已经播放过动画时，这些画面不属于任何分段，无法拼接
+                scene.template_complete = scene.renderer.num_plays == 0  # type: ignore
+                scene.template_segments = []  # type: ignore
+                register(Template._write_segments, scene)
+            scene.template_segments.append(segment)  # type: ignore
+
+    @staticmethod
+    def _finish_section(scene: Scene):
+        """结束当前分段的计时，发出 section 事件"""
+        if (section := getattr(scene, "template_section", None)) is None:
+            return
+        name, skipped, start = section
+        emit(
+            "section",
+            name=name,
+            project=Path(config.input_file).parent.name,
+            skipped=skipped,
+            job=environ.get("TEMPLATE_JOB"),
+            wall_time=perf_counter() - start,
+        )
+        scene.template_section = None  # type: ignore
+
+    @staticmethod
+    def _emit_movie(scene: Scene):
+        """渲染结束后发出 movie 事件，记录输出视频的路径（见 main.py prod --renditions）"""
+        if config.write_to_movie and not TimelinePlanner.active():
+            emit(
+                "movie",
+                project=Path(config.input_file).parent.name,
+                path=str(scene.renderer.file_writer.movie_file_path),
+            )
 
     @staticmethod
-    def splash_screen(scene: Scene):
-        """显示 Android 风格的启动屏动画"""
-        scene.next_section("开始动画")
+    def segment_key(
+        scene: Scene, name: str, dependencies: tuple, shared: bool = False
+    ) -> str:
+        """计算分段的内容哈希"""
+        return blake2b(
+            dumps(
+                {
+                    "name": name,
+                    "template": Template._source_hash(__file__),
+                    "project": (
+                        None if shared else Template._source_hash(getfile(type(scene)))
+                    ),
+                    "dependencies": dependencies,
+                    "mobjects": get_hash_from_play_call(
+                        scene, scene.renderer.camera, [], scene.mobjects
+                    ),
+                    "config": [
+                        config.pixel_width,
+                        config.pixel_height,
+                        config.frame_rate,
+                        config.movie_file_extension,
+                        config.background_color.to_hex(),
+                        environ.get("TEMPLATE_ENCODING"),
+                    ],
+                },
+                ensure_ascii=False,
+                default=repr,
+            ).encode(),
+            digest_size=16,
+        ).hexdigest()
+
+    @staticmethod
+    @cache
+    def _source_hash(filename: str) -> str:
+        """源代码文件的哈希"""
+        return blake2b(Path(filename).read_bytes(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _finish_segment(scene: Scene, checkpoint: bool = True):
+        """
+        结束当前分段
+
+        复用的分段按存储的时长推进场景时间，使之后的音频与字幕与拼接后的视频对齐。
+        设置了环境变量 TEMPLATE_CHECKPOINT 时，新渲染的分段由其动画片段拼接后立即存储。
+        """
+        segments = getattr(scene, "template_segments", [])
+        if not segments:
+            return
+        segment = segments[-1]
+        if segment["end"] is not None:
+            return
+        if segment["reused"]:
+            scene.renderer.time = segment["start"] + segment["stored_duration"]
+        segment["end"] = scene.renderer.time
+
+        # 检查点：分段一结束就存储，渲染中途失败后重试时可以直接复用（见 main.py）
+        section = scene.renderer.file_writer.sections[-1]
+        if (
+            checkpoint
+            and environ.get("TEMPLATE_CHECKPOINT")
+            and not segment["reused"]
+            and section.name == segment["name"]
+            and (files := [file for file in section.partial_movie_files if file])
+        ):
+            save_partial_movies(
+                segment["key"],
+                files,
+                {
+                    "name": segment["name"],
+                    "duration": segment["end"] - segment["start"],
+                    "tts": segment["tts"],
+                },
+            )
+
+    @staticmethod
+    def _write_segments(scene: Scene):
+        """
+        渲染结束后写入分段记录
+
+        有复用的分段时，另外导出完整的音轨：所有分段都被复用时 manim 不会输出视频，
+        拼接时无法从中取得音轨。
+        """
+        # 渲染中途失败时最后一个分段并不完整，不能作为检查点
+        Template._finish_segment(scene, checkpoint=False)
+        segments = scene.template_segments  # type: ignore
+        file_writer = scene.renderer.file_writer
+        videos = {segment["video"] for segment in segments}
+        complete = scene.template_complete and all(  # type: ignore
+            section.video in videos for section in file_writer.sections if section.video
+        )
+        if record_path := environ.get("TEMPLATE_SEGMENTS"):
+            audio_path = None
+            if file_writer.includes_sound and any(
+                segment["reused"] for segment in segments
+            ):
+                audio_path = Path(record_path).with_suffix(".wav")
+                file_writer.audio_segment.export(str(audio_path), format="wav")
+            Path(record_path).write_text(
+                dumps(
+                    {
+                        "movie": str(file_writer.movie_file_path),
+                        "sections_dir": str(file_writer.sections_output_dir),
+                        "audio": str(audio_path) if audio_path else None,
+                        "complete": complete,
+                        "segments": segments,
+                    },
+                    ensure_ascii=False,
+                ),
+                encoding="utf-8",
+            )
+
+    @staticmethod
+    def splash_screen(scene: Scene, *dependencies: Any):
+        """
+        显示 Android 风格的启动屏动画，随后开始“正文”分段
+
+        dependencies 为正文分段用到的其他模块中的数据（见 next_section）。
+        """
+        Template.next_section(scene, "开始动画", shared=True)
         avatar = ImageMobject(
             Path(__file__).resolve().parent / "assets" / "avatar.jpg"
         ).move_to(ORIGIN)
@@ -122,18 +875,48 @@ class Template:
             progressbar.animate.scale(4).fade(1),
         )
         scene.remove(avatar, progressbar, mask)
-        scene.next_section("正文", skip_animations=False)
+        Template.next_section(scene, "正文", *dependencies)
 
     @staticmethod
     def end_screen(scene: Scene, *animations: Animation):
         """显示 ManimBanner 结束动画"""
-        scene.next_section("结束动画")
+        Template.next_section(scene, "结束动画", *map(repr, animations), shared=True)
         banner = ManimBanner()
         scene.play(banner.create())
         scene.play(banner.expand())
         scene.wait(2)
         scene.play(Unwrite(banner), *animations)
         scene.wait(0.1)
+        Template._finish_segment(scene)
+        Template._finish_section(scene)
+
+    @staticmethod
+    def play_and_hold(
+        scene: Scene,
+        *animations: Animation,
+        hold: float,
+        subcaption: str | None = None,
+        subcaption_offset: float = 0,
+    ):
+        """
+        依次播放动画，再保持画面静止 hold 秒，
+        效果与 LaggedStart(*animations, Wait(hold), lag_ratio=1) 相同
+
+        放在动画组中的 Wait 会逐帧光栅化、编码；这里的静止部分用 scene.wait 播放，
+        manim 只渲染一帧并在整段时长内重复使用。字幕覆盖动画与静止的全部时长。
+        """
+        start = scene.time
+        scene.play(
+            LaggedStart(*animations, lag_ratio=1)
+            if len(animations) > 1
+            else animations[0]
+        )
+        scene.wait(hold)
+        if subcaption:
+            duration = scene.time - start
+            scene.add_subcaption(
+                subcaption, duration=duration, offset=subcaption_offset - duration
+            )
 
     @staticmethod
     def add_tts(
@@ -148,75 +931,101 @@ class Template:
     ) -> float:
         """为视频添加 TTS 音频，并返回音频时长"""
 
-        scene.renderer.skip_animations = False  # 确保 Scene.add_sound() 方法不被跳过
+        request = TTSRequest(text, voice, rate, volume, pitch)
 
-        cache_dir = Path(__file__).resolve().parent / "media" / "audios"
-        cache_dir.mkdir(parents=True, exist_ok=True)
+        # 记录时间线（见 main.py plan）时不合成也不添加音频
+        if TimelinePlanner.active():
+            cached = cached_duration(request)
+            duration = cached if cached is not None else estimate_duration(text, rate)
+            TimelinePlanner.timeline(scene)["narration"].append(
+                {
+                    "request": asdict(request),
+                    "section": TimelinePlanner.current_section(scene),
+                    "start": scene.time,
+                    "duration": duration,
+                    "cached": cached is not None,
+                }
+            )
+            return duration
 
-        cache_key = blake2b(
-            f"?={text}&={voice}&={rate}&={volume}&={pitch}".encode(), digest_size=16
-        ).hexdigest()
-        audio_path = cache_dir / f"{cache_key}.mp3"
-        audio_path_str = str(audio_path)
+        scene.renderer.skip_animations = False  # 确保 Scene.add_sound() 方法不被跳过
 
-        def use_this(use_cache: bool = False) -> float:
+        def use_this(audio_path: Path, duration: float, label: str, **event) -> float:
             """使用这个"""
-            duration = MP3(audio_path_str).info.length
+            if segments := getattr(scene, "template_segments", None):
+                segments[-1]["tts"].append(
+                    {"request": asdict(request), "duration": duration}
+                )
 
             print(
-                f"TTS {'缓存' if use_cache else '生成'}："
+                f"TTS {label}："
                 f"“{text[:10] + "……" + text[-10:] if len(text) > 20 else text}” "
                 f"{audio_path} ({duration}s)"
             )
+            emit_tts(bytes=audio_path.stat().st_size, duration=duration, **event)
 
-            if not use_cache:
-                with (cache_dir / "audios.jsonl").open("a", encoding="utf-8") as f:
-                    f.write(
-                        dumps(
-                            {
-                                "filename": audio_path.name,
-                                "duration": duration,
-                                "text": text,
-                                "voice": voice,
-                                "rate": rate,
-                                "volume": volume,
-                                "pitch": pitch,
-                            },
-                            ensure_ascii=False,
-                        )
-                        + "\n"
-                    )
-
-            scene.add_sound(audio_path_str)
+            scene.add_sound(str(audio_path))
 
             return duration
 
-        if audio_path.exists():
-            try:
-                if MP3(audio_path_str).info.length > 0:
-                    return use_this(True)
-                audio_path.unlink()
-            except HeaderNotFoundError:
-                audio_path.unlink()
+        def emit_tts(**event):
+            """发出 tts 事件"""
+            section = getattr(scene, "template_section", None)
+            emit(
+                "tts",
+                key=request.cache_key,
+                text=text[:20],
+                section=section[0] if section else None,
+                **{"synthesis_time": 0.0, "retries": 0, "backoff": 0.0, **event},
+            )
 
-        max_attempts = 3
+        # 基准测试（见 main.py bench）时不使用共享的音频缓存，使结果可复现
+        if (
+            not environ.get("TEMPLATE_BENCH")
+            and (duration := cached_duration(request)) is not None
+        ):
+            return use_this(request.audio_path, duration, "缓存", cache="hit")
 
-        for attempt in range(1, max_attempts + 1):
-            try:
-                communicate = Communicate(
-                    text=text,
-                    voice=voice,
-                    rate=rate,
-                    volume=volume,
-                    pitch=pitch,
-                )
-                communicate.save_sync(audio_path_str)
+        # 重试、退避、限流与熔断由共享的 TTS 客户端负责（见 tts.TTSClient）
+        backend = get_backend()
+        before = client_stats()
+        start = perf_counter()
+
+        def attempt_stats() -> dict[str, Any]:
+            """本次合成的重试次数、退避等待与合成耗时"""
+            after = client_stats()
+            backoff = after.backoff - before.backoff
+            return {
+                "retries": after.retries - before.retries,
+                "backoff": backoff,
+                "synthesis_time": perf_counter() - start - backoff,
+            }
+
+        try:
+            audio_path, duration = backend.synthesize(request)
+        except Exception as e:
+            emit_tts(
+                cache="miss",
+                backend=backend.name,
+                bytes=0,
+                error=repr(e),
+                **attempt_stats(),
+            )
+            raise
+        return use_this(
+            audio_path,
+            duration,
+            backend.label,
+            cache="miss",
+            backend=backend.name,
+            **attempt_stats(),
+        )
 
-                return use_this()
-            except Exception:  # pylint: disable=broad-exception-caught
-                if attempt < max_attempts:
-                    sleep(30 ** ((attempt * 0.1) + 1))
-                else:
-                    raise
 
-        raise RuntimeError("无法生成音频文件")
+TextGeometryCache.install()
+FontRegistry.install()
+PartialMovieEncoder.install()
+PartialMovieCache.install()
+NarrationMixer.install()
+TimelinePlanner.install()
+SectionProfiler.from_environ()
@@ -0,0 +1,714 @@
+"""TTS 音频的缓存与合成"""
+
+from asyncio import (
+    AbstractEventLoop,
+    CancelledError,
+    Lock as AsyncLock,
+    Semaphore,
+    all_tasks,
+    current_task,
+    gather,
+    new_event_loop,
+    run_coroutine_threadsafe,
+    sleep as async_sleep,
+)
+from abc import ABC, abstractmethod
+from atexit import register
+from concurrent.futures import Future, as_completed
+from dataclasses import dataclass, astuple, asdict, fields, replace
+from functools import cache
+from hashlib import blake2b
+from json import loads
+from os import environ, getpid
+from pathlib import Path
+from re import findall, fullmatch
+from random import uniform
+from shutil import rmtree
+from sqlite3 import Connection, connect
+from threading import Lock, Thread
+from time import monotonic, time, time_ns
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from events import emit
+
+# edge_tts、aiohttp 与 mutagen 导入较慢，且不朗读的场景用不到，因此在首次使用时才导入
+if TYPE_CHECKING:
+    from aiohttp import BaseConnector
+    from edge_tts import Communicate
+
+CACHE_DIR = Path(__file__).resolve().parent / "media" / "audios"
+INDEX_PATH = CACHE_DIR / "index.sqlite3"
+INDEX_VERSION = 2
+OFFLINE_DIR = CACHE_DIR / "offline"
+
+
+@dataclass(frozen=True)
+class TTSRequest:
+    """一条 TTS 请求"""
+
+    text: str
+    voice: str
+    # * edge_tts\communicate.py
+    rate: str = "+0%"
+    volume: str = "+0%"
+    pitch: str = "+0Hz"
+
+    def __post_init__(self):
+        parse_rate(self.rate)
+
+    @property
+    def cache_key(self) -> str:
+        """缓存键"""
+        return blake2b(
+            f"?={self.text}&={self.voice}&={self.rate}&={self.volume}&={self.pitch}".encode(),
+            digest_size=16,
+        ).hexdigest()
+
+    @property
+    def audio_path(self) -> Path:
+        """缓存音频的路径"""
+        return CACHE_DIR / f"{self.cache_key}.mp3"
+
+    def communicate(self, connector: "BaseConnector | None" = None) -> "Communicate":
+        """创建对应的 edge_tts 合成任务"""
+        # pylint: disable=import-outside-toplevel
+        from edge_tts import Communicate
+
+        return Communicate(
+            text=self.text,
+            voice=self.voice,
+            rate=self.rate,
+            volume=self.volume,
+            pitch=self.pitch,
+            connector=connector,
+        )
+
+
+def _probe(audio_path: Path) -> float | None:
+    """解析音频文件得到时长，文件损坏时返回 None"""
+    # pylint: disable=import-outside-toplevel
+    from mutagen.mp3 import MP3, HeaderNotFoundError
+
+    try:
+        duration = MP3(str(audio_path)).info.length
+    except HeaderNotFoundError:
+        return None
+    return duration if duration > 0 else None
+
+
+@cache
+def _index() -> Connection:
+    """
+    打开缓存索引
+
+    索引以缓存键为主键记录每个音频的时长、大小、修改时间与最近使用时间，
+    命中缓存时只需查询索引，无需解析音频。
+    索引不存在或版本无法迁移时，会根据缓存目录重新建立。
+    """
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    exists = INDEX_PATH.exists()
+    # 共享 TTS 客户端的后台线程也会写入索引；isolation_level=None 时每条语句自动提交，
+    # sqlite3 连接本身是串行化的，可以跨线程使用
+    connection = connect(
+        INDEX_PATH, timeout=30, isolation_level=None, check_same_thread=False
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if exists and version == 1:
+        connection.execute(
+            "ALTER TABLE audios ADD COLUMN last_used_ns INTEGER NOT NULL DEFAULT 0"
+        )
+        connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+    elif not exists or version != INDEX_VERSION:
+        rebuild_index(connection)
+    return connection
+
+
+def rebuild_index(connection: Connection):
+    """根据缓存目录重新建立索引，并合并旧版 audios.jsonl 中的请求参数"""
+    print("重建 TTS 缓存索引……")
+    metadata: dict[str, dict] = {}
+    legacy_manifest = CACHE_DIR / "audios.jsonl"
+    if legacy_manifest.exists():
+        with legacy_manifest.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = loads(line)
+                    metadata[Path(record["filename"]).stem] = record
+
+    connection.execute("BEGIN IMMEDIATE")
+    connection.execute("DROP TABLE IF EXISTS audios")
+    connection.execute(
+        """
+        CREATE TABLE audios (
+            key TEXT PRIMARY KEY,
+            duration REAL NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            text TEXT,
+            voice TEXT,
+            rate TEXT,
+            volume TEXT,
+            pitch TEXT,
+            last_used_ns INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    for audio_path in CACHE_DIR.glob("*.mp3"):
+        if (duration := _probe(audio_path)) is None:
+            audio_path.unlink()
+            continue
+        record = metadata.get(audio_path.stem, {})
+        _store(
+            connection,
+            audio_path.stem,
+            duration,
+            audio_path,
+            *(record.get(field.name) for field in fields(TTSRequest)),
+        )
+    connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+    connection.execute("COMMIT")
+    legacy_manifest.unlink(missing_ok=True)
+
+
+def _store(
+    connection: Connection,
+    key: str,
+    duration: float,
+    audio_path: Path,
+    *request_fields: str | None,
+):
+    """写入一条索引，缺少请求参数时记为空"""
+    stat = audio_path.stat()
+    request_fields = request_fields or (None,) * len(fields(TTSRequest))
+    connection.execute(
+        "INSERT OR REPLACE INTO audios"
+        " (key, duration, size, mtime_ns, text, voice, rate, volume, pitch, last_used_ns)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (key, duration, stat.st_size, stat.st_mtime_ns, *request_fields, time_ns()),
+    )
+
+
+def cached_duration(request: TTSRequest) -> float | None:
+    """
+    获取缓存音频的时长，音频不存在或已损坏时返回 None（损坏的文件会被删除）
+
+    索引中的大小和修改时间与文件一致时直接返回记录的时长；
+    否则重新解析这一个文件并更新索引。
+    """
+    connection = _index()
+    key = request.cache_key
+    try:
+        stat = request.audio_path.stat()
+    except FileNotFoundError:
+        connection.execute("DELETE FROM audios WHERE key = ?", (key,))
+        return None
+
+    row = connection.execute(
+        "SELECT duration, size, mtime_ns FROM audios WHERE key = ?", (key,)
+    ).fetchone()
+    if row is not None and row[1:] == (stat.st_size, stat.st_mtime_ns):
+        connection.execute(
+            "UPDATE audios SET last_used_ns = ? WHERE key = ?", (time_ns(), key)
+        )
+        return row[0]
+
+    if (duration := _probe(request.audio_path)) is None:
+        request.audio_path.unlink()
+        connection.execute("DELETE FROM audios WHERE key = ?", (key,))
+        return None
+    record_audio(request, duration)
+    return duration
+
+
+def collect_garbage(
+    max_size: int, protected_keys: Callable[[], Iterable[str]]
+) -> tuple[int, int]:
+    """
+    整理缓存，并按最近最少使用的顺序淘汰音频，直到缓存总大小不超过上限
+
+    整理时会删除索引中已不存在的文件记录、为索引外的音频补充记录、
+    清理离线占位音频与残留的临时文件，最后压缩索引。
+
+    Args:
+        max_size: 缓存总大小上限（字节）
+        protected_keys: 返回不可淘汰的缓存键，只在需要淘汰时调用
+
+    Returns:
+        tuple[int, int]: 淘汰的音频数与释放的字节数
+    """
+    connection = _index()
+    rmtree(OFFLINE_DIR, ignore_errors=True)
+    for temp_path in CACHE_DIR.glob("*.part"):
+        # 一小时前的临时文件不会属于仍在进行的合成
+        if temp_path.stat().st_mtime < time() - 3600:
+            temp_path.unlink()
+
+    indexed = {key for (key,) in connection.execute("SELECT key FROM audios")}
+    for audio_path in CACHE_DIR.glob("*.mp3"):
+        if audio_path.stem in indexed:
+            indexed.remove(audio_path.stem)
+        elif (duration := _probe(audio_path)) is not None:
+            _store(connection, audio_path.stem, duration, audio_path)
+        else:
+            audio_path.unlink()
+    connection.executemany(
+        "DELETE FROM audios WHERE key = ?", ((key,) for key in indexed)
+    )
+
+    entries = []
+    for key, size, last_used_ns in connection.execute(
+        "SELECT key, size, last_used_ns FROM audios"
+    ):
+        audio_path = CACHE_DIR / f"{key}.mp3"
+        # 没有使用记录时退回文件的访问时间
+        entries.append(
+            (max(last_used_ns, audio_path.stat().st_atime_ns), size, key, audio_path)
+        )
+    total_size = sum(size for _, size, _, _ in entries)
+
+    evicted = freed = 0
+    if total_size > max_size:
+        protected = set(protected_keys())
+        for _, size, key, audio_path in sorted(entries):
+            if total_size <= max_size:
+                break
+            if key in protected:
+                continue
+            audio_path.unlink()
+            connection.execute("DELETE FROM audios WHERE key = ?", (key,))
+            total_size -= size
+            evicted += 1
+            freed += size
+
+    connection.execute("VACUUM")
+    return evicted, freed
+
+
+def parse_rate(rate: str) -> int:
+    """
+    解析语速（如 "+10%"、"-20%"）为百分比
+
+    Raises:
+        ValueError: 如果语速格式无效或不大于 -100% 时
+    """
+    if not fullmatch(r"[+-]\d+%", rate) or int(rate[:-1]) <= -100:
+        raise ValueError(f'语速 "{rate}" 无效，应为 +N% 或 -N% 且大于 -100%')
+    return int(rate[:-1])
+
+
+def estimate_duration(text: str, rate: str = "+0%") -> float:
+    """根据文本长度和语速粗略估计朗读时长（秒）"""
+    characters = len(findall(r"[\u3400-\u9fff]", text))
+    words = len(findall(r"[A-Za-z0-9]+(?:[-'.][A-Za-z0-9]+)*", text))
+    pauses = len(findall(r"[，。！？；：、,.!?;:]", text))
+    seconds = characters * 0.22 + words * 0.4 + pauses * 0.2 + 0.3
+    return seconds / (1 + parse_rate(rate) / 100)
+
+
+def record_audio(request: TTSRequest, duration: float):
+    """把缓存音频的信息写入索引"""
+    _store(
+        _index(),
+        request.cache_key,
+        duration,
+        request.audio_path,
+        *astuple(request),
+    )
+
+
+def _temp_path(request: TTSRequest) -> Path:
+    """合成时使用的临时文件，写完后再改名，避免其他进程读到写了一半的音频"""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return request.audio_path.with_suffix(f".{getpid()}.part")
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器断开，暂停合成"""
+
+
+class TokenBucket:
+    """令牌桶限流"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = monotonic()
+        self._lock = AsyncLock()
+
+    async def acquire(self) -> float:
+        """取得一个令牌，返回等待的秒数；rate 不为正数时不限流"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+                await async_sleep(delay)
+                waited += delay
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败 threshold 次后断开，此后的请求立即失败，而不是继续重试与等待；
+    断开 reset_timeout 秒后允许请求再次尝试，成功一次即恢复。
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    def check(self):
+        """
+        检查是否允许请求
+
+        Raises:
+            CircuitOpenError: 如果熔断器断开时
+        """
+        if (
+            self.opened_at is not None
+            and monotonic() - self.opened_at < self.reset_timeout
+        ):
+            raise CircuitOpenError(
+                f"TTS 服务连续失败 {self.failures} 次，暂停 {self.reset_timeout:.0f} 秒"
+            )
+
+    def success(self):
+        """记录一次成功"""
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        """记录一次失败"""
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = monotonic()
+
+
+@dataclass
+class ClientStats:
+    """TTS 客户端的统计数据"""
+
+    # 合成请求数、最终成功数与最终失败数
+    requests: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    # 全部尝试次数与其中的重试次数
+    attempts: int = 0
+    retries: int = 0
+    # 重试前的退避等待与限流等待（秒）
+    backoff: float = 0.0
+    throttled: float = 0.0
+    # 熔断器断开时被拒绝的请求数
+    rejected: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"请求 {self.requests} 条，成功 {self.succeeded} 条，失败 {self.failed} 条，"
+            f"重试 {self.retries} 次，退避等待 {self.backoff:.1f} 秒，"
+            f"限流等待 {self.throttled:.1f} 秒，熔断拒绝 {self.rejected} 条"
+        )
+
+
+class TTSClient:
+    """
+    共享的 edge_tts 客户端
+
+    所有合成任务在同一个后台事件循环中执行，共用一个 aiohttp 连接器（及其 DNS 缓存与
+    SSL 上下文），并统一限制并发数与请求速率。失败时按带随机抖动的指数退避重试，
+    连续失败过多时熔断。edge_tts 每句话使用一条独立的 WebSocket 连接，
+    因此能复用的是事件循环与连接器，而不是 WebSocket 本身。
+
+    环境变量 TEMPLATE_TTS_URL 可以把服务地址替换为本地的替身 WebSocket 服务器，
+    地址中需要已经包含查询字符串（如 ws://127.0.0.1:8765/?token=test），
+    edge_tts 会在其后追加参数。
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        rate: float = 5.0,
+        max_attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.bucket = TokenBucket(rate, burst=concurrency)
+        self.stats = ClientStats()
+        self._semaphore = Semaphore(concurrency)
+        self._connector: "BaseConnector | None" = None
+        self._loop: AbstractEventLoop | None = None
+        self._thread: Thread | None = None
+        self._lock = Lock()
+
+    @staticmethod
+    def from_environ(concurrency: int | None = None) -> "TTSClient":
+        """
+        按环境变量 TEMPLATE_TTS_CONCURRENCY 与 TEMPLATE_TTS_RATE（每秒请求数）创建客户端
+
+        Args:
+            concurrency: 并发数，默认读取环境变量
+        """
+        return TTSClient(
+            concurrency=concurrency
+            or int(environ.get("TEMPLATE_TTS_CONCURRENCY", "4")),
+            rate=float(environ.get("TEMPLATE_TTS_RATE", "5")),
+        )
+
+    def _ensure_loop(self) -> AbstractEventLoop:
+        """启动后台事件循环"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = new_event_loop()
+                self._thread = Thread(
+                    target=self._loop.run_forever, name="tts-client", daemon=True
+                )
+                self._thread.start()
+                register(self.close)
+            return self._loop
+
+    def _get_connector(self) -> "BaseConnector":
+        """在事件循环中创建共享的连接器"""
+        if self._connector is not None:
+            return self._connector
+
+        # pylint: disable=import-outside-toplevel
+        from aiohttp import TCPConnector
+        import edge_tts.communicate
+
+        if url := environ.get("TEMPLATE_TTS_URL"):
+            edge_tts.communicate.WSS_URL = url
+
+        class SharedConnector(TCPConnector):
+            """供多个 ClientSession 共用的连接器，会话关闭时不随之关闭"""
+
+            def close(self, **_):
+                return async_sleep(0)
+
+            def shutdown(self):
+                """真正关闭连接器"""
+                return super().close()
+
+        self._connector = SharedConnector(limit=self.concurrency, ttl_dns_cache=300)
+        return self._connector
+
+    def backoff_delay(self, attempt: int) -> float:
+        """第 attempt 次失败后的退避时间：带完全随机抖动的指数退避"""
+        return uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    async def synthesize_async(self, request: TTSRequest) -> tuple[Path, float]:
+        """
+        在后台事件循环中合成音频，写入共享的音频缓存
+
+        Returns:
+            tuple[Path, float]: 音频路径与时长
+
+        Raises:
+            CircuitOpenError: 如果熔断器断开时
+        """
+        self.stats.requests += 1
+        async with self._semaphore:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    self.breaker.check()
+                except CircuitOpenError:
+                    self.stats.rejected += 1
+                    self.stats.failed += 1
+                    raise
+                self.stats.throttled += await self.bucket.acquire()
+                self.stats.attempts += 1
+                temp_path = _temp_path(request)
+                try:
+                    await request.communicate(self._get_connector()).save(
+                        str(temp_path)
+                    )
+                except CancelledError:
+                    raise
+                except (ValueError, TypeError):
+                    # 参数无效（如不存在的语音），重试也不会成功
+                    temp_path.unlink(missing_ok=True)
+                    self.stats.failed += 1
+                    raise
+                except Exception:  # pylint: disable=broad-exception-caught
+                    temp_path.unlink(missing_ok=True)
+                    self.breaker.failure()
+                    if attempt == self.max_attempts:
+                        self.stats.failed += 1
+                        raise
+                    delay = self.backoff_delay(attempt)
+                    self.stats.retries += 1
+                    self.stats.backoff += delay
+                    await async_sleep(delay)
+                else:
+                    self.breaker.success()
+                    self.stats.succeeded += 1
+                    return _commit(request, temp_path)
+        raise RuntimeError("无法生成音频文件")
+
+    def submit(self, request: TTSRequest) -> Future[tuple[Path, float]]:
+        """提交合成任务"""
+        return run_coroutine_threadsafe(
+            self.synthesize_async(request), self._ensure_loop()
+        )
+
+    def synthesize(self, request: TTSRequest) -> tuple[Path, float]:
+        """合成音频并等待完成"""
+        return self.submit(request).result()
+
+    def close(self):
+        """取消未完成的任务，关闭连接器与后台事件循环"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        async def shutdown():
+            tasks = [task for task in all_tasks() if task is not current_task()]
+            for task in tasks:
+                task.cancel()
+            await gather(*tasks, return_exceptions=True)
+            if self._connector is not None:
+                await self._connector.shutdown()  # type: ignore
+                self._connector = None
+
+        run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+        loop.close()
+        if self.stats.requests:
+            emit("tts_client", **asdict(self.stats))
+
+
+@cache
+def get_client() -> TTSClient:
+    """本进程共享的 TTS 客户端"""
+    return TTSClient.from_environ()
+
+
+def client_stats() -> ClientStats:
+    """共享 TTS 客户端当前统计数据的副本"""
+    return replace(get_client().stats)
+
+
+def _commit(request: TTSRequest, temp_path: Path) -> tuple[Path, float]:
+    """把合成好的临时文件移入缓存并写入索引"""
+    # pylint: disable=import-outside-toplevel
+    from mutagen.mp3 import MP3
+
+    temp_path.replace(request.audio_path)
+    duration = MP3(str(request.audio_path)).info.length
+    record_audio(request, duration)
+    return request.audio_path, duration
+
+
+class TTSBackend(ABC):
+    """TTS 后端"""
+
+    name = ""
+    # 打印日志时描述合成结果的用词
+    label = "生成"
+
+    @abstractmethod
+    def synthesize(self, request: TTSRequest) -> tuple[Path, float]:
+        """合成音频，返回音频路径与时长"""
+
+
+class EdgeBackend(TTSBackend):
+    """通过共享的 edge_tts 客户端在线合成，结果写入共享的音频缓存"""
+
+    name = "edge"
+
+    def synthesize(self, request: TTSRequest) -> tuple[Path, float]:
+        return get_client().synthesize(request)
+
+
+class OfflineBackend(TTSBackend):
+    """
+    离线生成静音的占位音频，时长根据文本长度与语速估计
+
+    占位音频写入单独的目录，不会进入共享的音频缓存。
+    """
+
+    name = "offline"
+    label = "占位"
+
+    # MPEG-1 Layer III、48 kHz、32 kbps、单声道的静音帧，每帧 1152 个采样
+    SILENT_FRAME = bytes([0xFF, 0xFB, 0x14, 0xC0]) + bytes(92)
+    FRAME_DURATION = 1152 / 48000
+
+    def synthesize(self, request: TTSRequest) -> tuple[Path, float]:
+        frames = max(
+            round(estimate_duration(request.text, request.rate) / self.FRAME_DURATION),
+            1,
+        )
+        OFFLINE_DIR.mkdir(parents=True, exist_ok=True)
+        audio_path = OFFLINE_DIR / request.audio_path.name
+        audio_path.write_bytes(self.SILENT_FRAME * frames)
+        return audio_path, frames * self.FRAME_DURATION
+
+
+BACKENDS: dict[str, TTSBackend] = {
+    backend.name: backend for backend in (EdgeBackend(), OfflineBackend())
+}
+
+
+def get_backend(name: str | None = None) -> TTSBackend:
+    """
+    获取 TTS 后端
+
+    Args:
+        name: 后端名称，默认读取环境变量 TEMPLATE_TTS，未设置时为 edge
+
+    Raises:
+        ValueError: 如果后端不存在时
+    """
+    name = name or environ.get("TEMPLATE_TTS") or EdgeBackend.name
+    if name not in BACKENDS:
+        raise ValueError(f'TTS 后端 "{name}" 不存在')
+    return BACKENDS[name]
+
+
+def prefetch(requests: Iterable[TTSRequest], concurrency: int = 8) -> tuple[int, int]:
+    """
+    并发合成缓存中缺失的音频
+
+    Args:
+        requests: TTS 请求（可以重复）
+        concurrency: 同时进行的合成任务数
+
+    Returns:
+        tuple[int, int]: 已缓存的请求数与新合成的请求数
+    """
+    unique = {request.cache_key: request for request in requests}
+    missing = [
+        request for request in unique.values() if cached_duration(request) is None
+    ]
+    client = TTSClient.from_environ(concurrency)
+    try:
+        futures = {client.submit(request): request for request in missing}
+        for future in as_completed(futures):
+            _, duration = future.result()
+            print(f"TTS 预取：“{futures[future].text[:20]}” ({duration}s)")
+    finally:
+        client.close()
+        print(f"TTS 客户端：{client.stats}")
+    return len(unique) - len(missing), len(missing)